@@ -0,0 +1,105 @@
+"""Check and time the fused cleaner against escape_char and fix_bad_indent.
+
+The reference is the per-line pipeline used before: strip, escape_char,
+fix_bad_indent and one "<p>" tag per paragraph. Random chapters mixing
+commas, colons, lowercase continuations, markup characters, blank lines and
+non-latin text must give the same output with both, then both are timed on
+normal chapters and on a chapter wrapped after every word. The same check
+runs with the tests, see tests/test_cleaner.py.
+
+Usage:
+    python benchmarks/cleaner.py [--chapters 300] [--cases 5000]
+"""
+
+import argparse
+import random
+import sys
+import timeit
+
+from novelutils.utils.file import escape_char, fix_bad_indent, merge_lines, p_tags
+
+PIECES = [
+    "Chương",
+    "mặt trời",
+    "anh ta,",
+    "nói:",
+    "rằng",
+    "Không",
+    "x < y",
+    "a & b",
+    "ⅰ roman",
+    "中文",
+    "ệ",
+    "",
+    " ",
+    "  tab\t",
+    "end.",
+    "(paren",
+    "Đây",
+    "ß",
+]
+
+
+def reference(text: str) -> str:
+    """Convert lines to <p> tags with the original functions."""
+    lines = [escape_char(line.strip()) for line in text.splitlines()]
+    return "\n\n  ".join("<p>" + line + "</p>" for line in fix_bad_indent(tuple(lines)))
+
+
+def fused(text: str) -> str:
+    """Convert lines to <p> tags with the fused cleaner."""
+    return p_tags(merge_lines([line.strip() for line in text.splitlines()]))
+
+
+def random_text(rnd: random.Random, lines: int) -> str:
+    """Return a random chapter body."""
+    return "\n".join(
+        " ".join(rnd.choice(PIECES) for _ in range(rnd.randint(0, 6)))
+        for _ in range(lines)
+    )
+
+
+def check(cases: int) -> int:
+    """Compare both pipelines, return the number of mismatches."""
+    rnd = random.Random(0)
+    bad = 0
+    for _ in range(cases):
+        text = random_text(rnd, rnd.randint(0, 12))
+        try:
+            expected = reference(text)
+        except IndexError:
+            expected = IndexError
+        try:
+            got = fused(text)
+        except IndexError:
+            got = IndexError
+        if got != expected:
+            bad += 1
+            if bad <= 3:
+                print(f"mismatch for {text!r}:\n  {expected!r}\n  {got!r}")
+    return bad
+
+
+def main() -> int:
+    """Run the equivalence check and the timings."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chapters", type=int, default=300)
+    parser.add_argument("--cases", type=int, default=5000)
+    args = parser.parse_args()
+    bad = check(args.cases)
+    print(f"equivalence: {args.cases - bad}/{args.cases} cases match")
+    rnd = random.Random(1)
+    chapters = [random_text(rnd, 80) for _ in range(args.chapters)]
+    # every line continues the previous one, the worst case for += merging
+    wrapped = "\n".join(["Start"] + ["word"] * 50000)
+    for name, data in (("chapters", chapters), ("wrapped", [wrapped])):
+        for func in (reference, fused):
+            seconds = min(
+                timeit.repeat(lambda: [func(x) for x in data], number=1, repeat=5)
+            )
+            print(f"{name:<10}{func.__name__:<11}{seconds * 1000:9.1f} ms")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+"""Compare the size and time of the EPUB compression profiles.
+
+A synthetic novel (see synthetic.py) is written to a temporary raw directory,
+then an epub is built in stream mode for every profile and number of
+compression threads.
+
+Usage:
+    python benchmarks/compression.py [--chapters 2000] [--threads 1 4]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from novelutils.utils.epub import EpubMaker
+from novelutils.utils.zipwriter import PROFILES
+from synthetic import make_novel
+
+
+def main() -> int:
+    """Run the benchmark and print a table of size and time."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chapters", type=int, default=2000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        raw = Path(tmp) / "raw"
+        make_novel(raw, args.chapters)
+        print(f"{'profile':<10}{'threads':>8}{'size KiB':>12}{'time s':>9}")
+        for profile in PROFILES:
+            for threads in args.threads:
+                out = Path(tmp) / f"{profile}-{threads}"
+                out.mkdir()
+                e = EpubMaker(output=out, compression=profile, zip_workers=threads)
+                start = time.perf_counter()
+                e.from_raw(raw, False, "vi", stream=True)
+                elapsed = time.perf_counter() - start
+                size = next(out.glob("*.epub")).stat().st_size
+                print(f"{profile:<10}{threads:>8}{size / 1024:>12.1f}{elapsed:>9.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
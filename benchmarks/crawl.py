@@ -0,0 +1,126 @@
+"""Time NovelCrawler.crawl against the local mock site.
+
+The mock site (see mocksite.py) is served from this process, then every
+concurrency level crawls the whole novel with MockCrawler (see
+mockspider.py) in a fresh process, since the Twisted reactor cannot be
+restarted. Throughput is given in pages served per
+second, and the time to completion includes the info page, the toc and the
+retries of the failed or throttled chapters. Toc entries repeating the link
+of the previous chapter are expected to be skipped, they are not counted as
+missing chapters. Mirror pages are kept, skipping near duplicates is opt-in.
+
+Usage:
+    python benchmarks/crawl.py [--chapters 500] [--latency 0.05]
+        [--error_rate 0.01] [--throttle 16] [--duplicates 0.05]
+        [--concurrency 8 16 32]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+from mocksite import MockSite
+
+
+def run_crawl(url: str, raw: Path, concurrency: int, verbose: bool) -> dict:
+    """Crawl the novel once in this process, return its time and chapters."""
+    from mockspider import MockCrawler
+    from novelutils.utils.rawstore import open_raw
+
+    if not verbose:
+        # the crawl logs every request to stderr
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 2)
+    start = time.perf_counter()
+    MockCrawler(url).crawl(
+        rm_raw=True,
+        start_chap=1,
+        stop_chap=-1,
+        clean=False,
+        output=raw,
+        concurrency=concurrency,
+    )
+    seconds = time.perf_counter() - start
+    source = open_raw(raw)
+    chapters = len(source.chapter_ids())
+    source.close()
+    return {"seconds": seconds, "chapters": chapters}
+
+
+def run(args) -> dict:
+    """Crawl the mock site at every concurrency and print the results."""
+    site = MockSite(
+        args.chapters,
+        args.latency,
+        args.error_rate,
+        args.throttle,
+        lang=args.lang,
+        duplicates=args.duplicates,
+    )
+    args.expected = args.chapters - len(site.same_link)
+    url = site.start()
+    results = {}
+    print(
+        f"{'concurrency':>11}{'time s':>9}{'pages':>8}{'pages/s':>9}"
+        f"{'chapters':>10}{'429':>6}{'500':>6}"
+    )
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for concurrency in args.concurrency:
+                site.reset()
+                with ProcessPoolExecutor(
+                    1, mp_context=get_context("spawn")
+                ) as executor:
+                    r = executor.submit(
+                        run_crawl,
+                        url,
+                        Path(tmp) / str(concurrency) / "raw",
+                        concurrency,
+                        args.verbose,
+                    ).result()
+                r["pages"] = sum(site.status.values())
+                r["pages_per_s"] = r["pages"] / r["seconds"]
+                r["mib"] = site.bytes / 2**20
+                r["throttled"] = site.status[429]
+                r["errors"] = site.status[500]
+                results[str(concurrency)] = r
+                print(
+                    f"{concurrency:>11}{r['seconds']:>9.2f}{r['pages']:>8}"
+                    f"{r['pages_per_s']:>9.1f}{r['chapters']:>10}"
+                    f"{r['throttled']:>6}{r['errors']:>6}"
+                )
+    finally:
+        site.stop()
+    return results
+
+
+def main() -> int:
+    """Run the crawl benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chapters", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error_rate", type=float, default=0.0)
+    parser.add_argument("--throttle", type=int, default=0)
+    parser.add_argument("--lang", choices=("vi", "zh", "mixed"), default="vi")
+    parser.add_argument("--duplicates", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--verbose", action="store_true", help="show the logs")
+    args = parser.parse_args()
+    results = run(args)
+    incomplete = [c for c, r in results.items() if r["chapters"] != args.expected]
+    if incomplete:
+        print(
+            f"Expected {args.expected} chapters at concurrency: "
+            f"{', '.join(incomplete)}"
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
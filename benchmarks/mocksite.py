@@ -0,0 +1,229 @@
+"""Serve a synthetic novel site locally, in the markup of DemoSpider.
+
+The site has one novel: the info page at /novel/, the toc at /toc, the
+chapters at /novel/c<N> and the cover at /cover.jpg. Like DemoSpider expects,
+links in the pages are absolute, and the toc is at the path of the fixed toc
+link of the spider (see mockspider.py). Chapters come from the
+synthetic generator (see synthetic.py), so the content only depends on the
+chapter id. Every response waits for the latency, chapters fail with HTTP 500
+at the error rate, and requests over the throttle limit get HTTP 429 with a
+Retry-After header, like busy novel sites do. At the duplicate rate, a toc
+entry repeats the previous chapter, either with the same link or as a mirror
+page adding a line of ads.
+
+Usage:
+    python benchmarks/mocksite.py [--port 8000] [--chapters 1000]
+        [--latency 0.05] [--error_rate 0.01] [--throttle 16] [--duplicates 0.05]
+"""
+
+import argparse
+import html
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+from synthetic import chapter_text
+
+
+class MockSite:
+    """Settings and counters of the mock site, see the module docstring."""
+
+    def __init__(
+        self,
+        chapters: int = 1000,
+        latency: float = 0.05,
+        error_rate: float = 0.0,
+        throttle: int = 0,
+        retry_after: int = 1,
+        lang: str = "vi",
+        seed: int = 0,
+        duplicates: float = 0.0,
+    ) -> None:
+        """Configure the site.
+
+        Args:
+            chapters: number of chapters in the toc
+            latency: seconds waited before each response
+            error_rate: probability that a chapter request gets HTTP 500
+            throttle: maximum number of requests served at the same time,
+                the others get HTTP 429, 0 for no limit
+            retry_after: value of the Retry-After header of HTTP 429
+            lang: language of the chapters, vi, zh or mixed
+            seed: seed of the errors and the duplicates
+            duplicates: probability that a toc entry repeats the previous one
+
+        Returns:
+            None
+        """
+        self.chapters = chapters
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.lang = lang
+        self.rnd = random.Random(seed)
+        # toc entries linking the previous chapter, and mirrors of it
+        self.same_link = set()
+        self.mirrors = set()
+        for i in range(2, chapters + 1):
+            if self.rnd.random() < duplicates:
+                (self.same_link if i % 2 else self.mirrors).add(i)
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.status = Counter()  # number of responses of each status
+        self.bytes = 0
+        self.server = None
+        self.cover = None
+
+    def start(self, port: int = 0) -> str:
+        """Serve the site from a background thread.
+
+        Args:
+            port: port of the server, 0 for a free port
+
+        Returns:
+            str: link of the info page of the novel
+        """
+        from PIL import Image
+
+        buf = BytesIO()
+        Image.new("RGB", (600, 800), "gray").save(buf, "JPEG")
+        self.cover = buf.getvalue()
+        ThreadingHTTPServer.request_queue_size = 256
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self.server.daemon_threads = True
+        self.server.site = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_address[1]}/novel/"
+
+    def stop(self) -> None:
+        """Stop the server."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset(self) -> None:
+        """Reset the counters between two runs."""
+        with self.lock:
+            self.status.clear()
+            self.bytes = 0
+
+    def page(self, path: str, origin: str):
+        """Return status, content type and body of the page.
+
+        Args:
+            path: path of the page
+            origin: scheme and host of the site, for the links of the page
+
+        Returns:
+            Tuple[int, str, bytes]: status, content type and body
+        """
+        if path == "/cover.jpg":
+            return 200, "image/jpeg", self.cover
+        if path == "/novel/":
+            body = (
+                f'<div id="cover"><img src="{origin}/cover.jpg"/></div>'
+                '<h1 id="title">Truyện thử nghiệm</h1>'
+                '<span id="author">Tác giả</span>'
+                '<div id="types"><p>Tiên hiệp</p><p>Huyền huyễn</p></div>'
+                '<div id="foreword"><p>Một bộ truyện tổng hợp,</p>'
+                "<p>dùng để đo tốc độ tải.</p></div>"
+            )
+        elif path == "/toc":
+            body = "".join(
+                f'<a class="link-chap-{i}" '
+                f'href="{origin}/novel/c{i - 1 if i in self.same_link else i}">'
+                f"Chương {i}</a>"
+                for i in range(1, self.chapters + 1)
+            )
+        elif path.startswith("/novel/c") and path[8:].isdigit():
+            chap_id = int(path[8:])
+            if not 1 <= chap_id <= self.chapters:
+                return 404, "text/plain", b""
+            with self.lock:
+                failed = self.rnd.random() < self.error_rate
+            if failed:
+                return 500, "text/plain", b""
+            mirror = chap_id in self.mirrors
+            if mirror:
+                chap_id -= 1
+            lines = chapter_text(random.Random(chap_id), chap_id, self.lang)
+            lines = [html.escape(line) for line in lines.splitlines()]
+            if mirror:
+                lines.append("Đọc truyện nhanh nhất tại trang của chúng tôi.")
+            body = f'<h2 id="chapter-title">{lines[0]}</h2><div id="chapter">'
+            body += "".join(f"<p>{line}</p>" for line in lines[1:]) + "</div>"
+        else:
+            return 404, "text/plain", b""
+        page = f'<html><head><meta charset="utf-8"/></head><body>{body}</body></html>'
+        return 200, "text/html; charset=utf-8", page.encode("utf-8")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serve the pages of the mock site of the server."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        """Keep the benchmark output clean."""
+
+    def do_GET(self):
+        site: MockSite = self.server.site
+        with site.lock:
+            site.inflight += 1
+            throttled = site.throttle and site.inflight > site.throttle
+        try:
+            time.sleep(site.latency)
+            if throttled:
+                status, content_type, body = 429, "text/plain", b""
+            else:
+                status, content_type, body = site.page(
+                    self.path, f"http://{self.headers['Host']}"
+                )
+            self.send_response(status)
+            if status == 429:
+                self.send_header("Retry-After", str(site.retry_after))
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with site.lock:
+                site.inflight -= 1
+                site.status[status] += 1
+                site.bytes += len(body)
+
+
+def main() -> int:
+    """Serve the mock site until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--chapters", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error_rate", type=float, default=0.0)
+    parser.add_argument("--throttle", type=int, default=0)
+    parser.add_argument("--lang", choices=("vi", "zh", "mixed"), default="vi")
+    parser.add_argument("--duplicates", type=float, default=0.0)
+    args = parser.parse_args()
+    site = MockSite(
+        args.chapters,
+        args.latency,
+        args.error_rate,
+        args.throttle,
+        lang=args.lang,
+        duplicates=args.duplicates,
+    )
+    print(f"Serving {site.start(args.port)}, Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        site.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+"""Crawl the mock site of the benchmarks with the demo spider.
+
+The shipped spider registry only maps real domains, so the benchmarks use
+MockCrawler, which always picks MockSpider whatever the link is.
+"""
+
+from urllib.parse import urlsplit
+
+from novelutils.app.spiders.template import DemoSpider
+from novelutils.utils.crawler import NovelCrawler
+
+DEMO_ORIGIN = "https://example.com"
+
+
+class MockSpider(DemoSpider):
+    """The demo spider, for the markup served by mocksite.py.
+
+    DemoSpider requests the toc at a fixed link of example.com, which is
+    sent to the mock site instead. Everything else is the demo spider.
+    """
+
+    name = "mock"
+
+    def parse(self, response, **kwargs):
+        """Parse the info page with DemoSpider, on the mock site."""
+        url = urlsplit(response.url)
+        origin = f"{url.scheme}://{url.netloc}"
+        for r in super().parse(response, **kwargs):
+            if getattr(r, "url", "").startswith(DEMO_ORIGIN):
+                r = r.replace(url=origin + r.url[len(DEMO_ORIGIN) :])
+            yield r
+
+
+class MockCrawler(NovelCrawler):
+    """Crawl the mock site, served on the loopback address."""
+
+    def get_spider(self):
+        """Return MockSpider instead of looking the domain up."""
+        return MockSpider
@@ -0,0 +1,115 @@
+"""Measure the startup time of the novelutils command line.
+
+Each command runs in a fresh interpreter, so the time includes every import
+done before the subcommand starts working. The script fails when the median
+time of a command is over the budget or when a heavy dependency is imported
+by a command which does not need it: at startup, and after running the
+commands working on a raw directory (convert, rm_dup, epub from_raw), which
+must not import the crawling dependencies.
+
+Usage:
+    python benchmarks/startup.py [--runs 20] [--budget 0.25]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from synthetic import make_novel
+
+HEAVY = ("scrapy", "twisted", "tldextract", "validators", "PIL")
+
+COMMANDS = {
+    "import": "import novelutils",
+    "--version": "import novelutils; novelutils.main(['novelutils', '--version'])",
+    "parser": "import novelutils; novelutils._build_parser()",
+}
+
+CHECK = """
+import sys, novelutils
+novelutils._build_parser()
+print(",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+# only needed to crawl, see the lazy imports of novelutils/__init__.py
+CRAWL_ONLY = ("scrapy", "twisted", "tldextract")
+
+RAW_COMMANDS = {
+    "convert": ["convert", "raw"],
+    "epub from_raw": ["epub", "from_raw", "raw"],
+    "rm_dup": ["rm_dup", "raw"],
+}
+
+RUN = """
+import sys, novelutils
+novelutils.main(["novelutils", *{argv!r}])
+print(",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def time_command(code: str, runs: int) -> float:
+    """Return the median wall time of running the code in a new interpreter."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", code], check=True, stdout=subprocess.DEVNULL
+        )
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def check_commands() -> bool:
+    """Run the raw directory commands, return True if one imports CRAWL_ONLY."""
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        make_novel(Path(tmp) / "raw", 20)
+        for name, argv in RAW_COMMANDS.items():
+            out = subprocess.run(
+                [sys.executable, "-c", RUN.format(argv=argv, heavy=CRAWL_ONLY)],
+                check=True,
+                capture_output=True,
+                text=True,
+                cwd=tmp,
+            ).stdout.strip()
+            if out:
+                print(f"crawling modules imported by {name}: {out}")
+                failed = True
+    return failed
+
+
+def main() -> int:
+    """Run the benchmark, return non-zero if the budget is exceeded."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20, help="runs per command")
+    parser.add_argument(
+        "--budget", type=float, default=0.25, help="median seconds allowed per command"
+    )
+    args = parser.parse_args()
+    failed = False
+    baseline = time_command("pass", args.runs)
+    print(f"{'python':<16}{baseline * 1000:8.1f} ms")
+    for name, code in COMMANDS.items():
+        median = time_command(code, args.runs)
+        over = median > args.budget
+        failed |= over
+        print(f"{name:<16}{median * 1000:8.1f} ms{'  OVER BUDGET' if over else ''}")
+    out = subprocess.run(
+        [sys.executable, "-c", CHECK.format(heavy=HEAVY)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+    if out:
+        print(f"heavy modules imported at startup: {out}")
+        failed = True
+    failed |= check_commands()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
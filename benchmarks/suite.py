@@ -0,0 +1,172 @@
+"""Time the hot paths on synthetic novels and compare them with a baseline.
+
+For every size, a synthetic raw directory is generated (see synthetic.py),
+then each stage runs in a fresh process so its peak RSS is its own:
+FileConverter.clean, FileConverter.convert_to_xhtml, EpubMaker.from_raw and
+fix_bad_indent on the lines of every chapter. Throughput is given in chapters
+and MiB of raw text per second, from the fastest of the repeated runs.
+
+Results can be saved as a baseline and later runs compared with it: the
+script fails when a stage is slower or uses more memory than the baseline
+beyond the tolerance.
+
+Usage:
+    python benchmarks/suite.py [--sizes 100 10000 50000] [--jobs 1] [--repeat 3]
+        [--save baseline.json] [--compare baseline.json] [--tolerance 0.15]
+"""
+
+import argparse
+import json
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from shutil import copytree
+
+from synthetic import LANGS, make_novel
+
+STAGES = ("clean", "convert", "epub", "fix_bad_indent")
+
+
+def run_stage(stage: str, raw: Path, work: Path, jobs: int) -> dict:
+    """Run the stage once in this process, return its time and peak RSS."""
+    from novelutils.utils.epub import EpubMaker
+    from novelutils.utils.file import FileConverter, fix_bad_indent
+    from novelutils.utils.rawstore import open_raw
+
+    work.mkdir()
+    if stage == "epub":
+        # from_raw converts incrementally next to the raw directory, a copy
+        # keeps each run from reusing the chapters of the previous one
+        raw = Path(copytree(raw, work / "novel" / "raw"))
+    if stage == "fix_bad_indent":
+        source = open_raw(raw)
+        chapters = [
+            tuple(
+                line.strip()
+                for line in source.read_chapter(chap_id).decode("utf-8").splitlines()
+            )
+            for chap_id in source.chapter_ids()
+        ]
+    start = time.perf_counter()
+    if stage == "clean":
+        with FileConverter(raw, work) as c:
+            c.clean(False, rm_result=True, workers=jobs)
+    elif stage == "convert":
+        with FileConverter(raw, work) as c:
+            c.convert_to_xhtml(False, rm_result=True, lang_code="vi", workers=jobs)
+    elif stage == "epub":
+        EpubMaker(output=work).from_raw(raw, False, "vi", workers=jobs)
+    else:
+        for lines in chapters:
+            fix_bad_indent(lines)
+    seconds = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux, workers of --jobs count as children
+    rss = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return {"seconds": seconds, "peak_rss_mib": rss / 1024}
+
+
+def measure(stage: str, raw: Path, work: Path, jobs: int, repeat: int) -> dict:
+    """Run the stage in fresh processes, keep the fastest run."""
+    runs = []
+    for i in range(repeat):
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as executor:
+            runs.append(
+                executor.submit(
+                    run_stage, stage, raw, work / f"{stage}-{i}", jobs
+                ).result()
+            )
+    best = min(runs, key=lambda run: run["seconds"])
+    best["peak_rss_mib"] = max(run["peak_rss_mib"] for run in runs)
+    return best
+
+
+def run(args) -> dict:
+    """Run every stage on every size and print the results."""
+    results = {}
+    print(
+        f"{'chapters':>9} {'stage':<15}{'time s':>9}{'chap/s':>11}{'MiB/s':>8}"
+        f"{'RSS MiB':>9}"
+    )
+    for chapters in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            raw = Path(tmp) / "novel" / "raw"
+            size = make_novel(raw, chapters, args.lang, packed=args.packed)
+            sized = results[str(chapters)] = {}
+            for stage in args.stages:
+                r = measure(stage, raw, Path(tmp), args.jobs, args.repeat)
+                r["chapters_per_s"] = chapters / r["seconds"]
+                r["mib_per_s"] = size / 2**20 / r["seconds"]
+                sized[stage] = r
+                print(
+                    f"{chapters:>9} {stage:<15}{r['seconds']:>9.2f}"
+                    f"{r['chapters_per_s']:>11.0f}{r['mib_per_s']:>8.1f}"
+                    f"{r['peak_rss_mib']:>9.1f}"
+                )
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> int:
+    """Print the change of every stage, return the number of regressions."""
+    bad = 0
+    print(f"\n{'chapters':>9} {'stage':<15}{'speed':>9}{'RSS':>9}")
+    for chapters, stages in results.items():
+        for stage, r in stages.items():
+            base = baseline["results"].get(chapters, {}).get(stage)
+            if base is None:
+                continue
+            speed = r["chapters_per_s"] / base["chapters_per_s"] - 1
+            rss = r["peak_rss_mib"] / base["peak_rss_mib"] - 1
+            flag = ""
+            if speed < -tolerance or rss > tolerance:
+                flag = "  REGRESSION"
+                bad += 1
+            print(f"{chapters:>9} {stage:<15}{speed:>+9.1%}{rss:>+9.1%}{flag}")
+    return bad
+
+
+def main() -> int:
+    """Run the suite, save or compare the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10000])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--lang", choices=LANGS, default="mixed")
+    parser.add_argument("--packed", action="store_true")
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", type=Path, metavar="JSON")
+    parser.add_argument("--compare", type=Path, metavar="JSON")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+    results = run(args)
+    if args.save is not None:
+        args.save.write_text(
+            json.dumps(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "jobs": args.jobs,
+                    "lang": args.lang,
+                    "results": results,
+                },
+                indent=2,
+            ),
+            encoding="utf-8",
+        )
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        bad = compare(results, baseline, args.tolerance)
+        print(f"{bad} regressions over {args.tolerance:.0%} tolerance")
+        return 1 if bad else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
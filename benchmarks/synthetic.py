@@ -0,0 +1,148 @@
+"""Generate synthetic raw directories for the benchmarks.
+
+Chapters mix Vietnamese and Chinese text the way crawled novels do: lines
+wrapped in the middle of a sentence, stray blank lines and indentation, and
+chapters whose title is repeated on the second line. The output only depends
+on the seed.
+
+Usage:
+    python benchmarks/synthetic.py [--chapters 10000] [--lang mixed] OUTPUT
+"""
+
+import argparse
+import random
+import sys
+from pathlib import Path
+
+VI_WORDS = (
+    "mặt trời lên cao gió thổi qua rừng anh ta nói rằng không biết đường về "
+    "nhà cô ấy cười nhẹ một tiếng rồi quay đi trong lòng dâng lên cảm giác lạ "
+    "thiên địa linh khí tu luyện đột phá cảnh giới sư phụ đệ tử tông môn"
+).split()
+ZH_WORDS = (
+    "天地 灵气 修炼 突破 境界 师父 弟子 宗门 他 说道 我 不知道 回家 的 路 "
+    "她 轻轻 一笑 转身 离去 心中 涌起 一种 奇怪 感觉"
+).split()
+LANGS = ("vi", "zh", "mixed")
+
+
+def chapter_text(
+    rnd: random.Random,
+    chap_id: int,
+    lang: str,
+    paragraphs: int = 30,
+    wrap: float = 0.3,
+    duplicate: float = 0.2,
+) -> str:
+    """Return the raw text of a synthetic chapter.
+
+    Args:
+        rnd: random generator
+        chap_id: id of the chapter, used in its title
+        lang: vi, zh or mixed
+        paragraphs: number of paragraphs
+        wrap: probability that a paragraph is broken over several lines
+        duplicate: probability that the title is repeated on the second line
+
+    Returns:
+        str: the chapter, title on the first line
+    """
+    if lang == "mixed":
+        lang = "zh" if chap_id % 3 == 0 else "vi"
+    if lang == "zh":
+        title = f"第{chap_id}章 {rnd.choice(ZH_WORDS)}{rnd.choice(ZH_WORDS)}"
+        words, sep, comma, stop = ZH_WORDS, "", "，", "。"
+    else:
+        title = f"Chương {chap_id}: {rnd.choice(VI_WORDS).capitalize()}"
+        words, sep, comma, stop = VI_WORDS, " ", ",", "."
+    lines = [title]
+    if rnd.random() < duplicate:
+        lines.append(title)
+    for _ in range(paragraphs):
+        sentence = [rnd.choice(words) for _ in range(rnd.randint(8, 60))]
+        sentence[0] = sentence[0].capitalize()
+        if rnd.random() < wrap:
+            # break after a comma or before a lowercase word, like Notepad does
+            cut = rnd.randint(1, len(sentence) - 1)
+            if rnd.random() < 0.5:
+                lines.append(sep.join(sentence[:cut]) + comma)
+            else:
+                lines.append(sep.join(sentence[:cut]))
+            lines.append("  " + sep.join(sentence[cut:]) + stop)
+        else:
+            lines.append(sep.join(sentence) + stop)
+        if rnd.random() < 0.1:
+            lines.append(rnd.choice(("", "   ", "\t")))
+    return "\n".join(lines)
+
+
+def make_novel(
+    raw: Path,
+    chapters: int,
+    lang: str = "mixed",
+    seed: int = 0,
+    paragraphs: int = 30,
+    wrap: float = 0.3,
+    duplicate: float = 0.2,
+    packed: bool = False,
+) -> int:
+    """Write a synthetic novel to the raw directory.
+
+    Args:
+        raw: path of the raw directory, created if needed
+        chapters: number of chapters
+        lang: vi, zh or mixed
+        seed: seed of the random generator
+        paragraphs: number of paragraphs of each chapter
+        wrap: probability that a paragraph is broken over several lines
+        duplicate: probability that a title is repeated on the second line
+        packed: if specified, move the files into the packed raw store
+
+    Returns:
+        int: total size of the chapters in bytes
+    """
+    from PIL import Image
+
+    raw.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", (600, 800), "gray").save(raw / "cover.jpg", "JPEG")
+    (raw / "foreword.txt").write_text(
+        "Synthetic\nAuthor\nhttps://example.com/synthetic\nFantasy\n"
+        "A synthetic novel,\nwrapped badly.",
+        encoding="utf-8",
+    )
+    rnd = random.Random(seed)
+    size = 0
+    for i in range(1, chapters + 1):
+        content = chapter_text(rnd, i, lang, paragraphs, wrap, duplicate)
+        size += (raw / f"{i}.txt").write_bytes(content.encode("utf-8"))
+    if packed:
+        from novelutils.utils.rawstore import pack
+
+        pack(raw)
+    return size
+
+
+def main() -> int:
+    """Write the synthetic novel to the output directory."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chapters", type=int, default=10000)
+    parser.add_argument("--lang", choices=LANGS, default="mixed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--paragraphs", type=int, default=30)
+    parser.add_argument("--packed", action="store_true")
+    parser.add_argument("output", type=Path)
+    args = parser.parse_args()
+    size = make_novel(
+        args.output,
+        args.chapters,
+        args.lang,
+        args.seed,
+        args.paragraphs,
+        packed=args.packed,
+    )
+    print(f"{args.chapters} chapters, {size / 2 ** 20:.1f} MiB: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,18 +4,38 @@ NOVELUTILS uses the Scrapy framework to download novel from a website
 and convert all chapters to XHTML, TXT, or to make EPUB.
 """
 import argparse
+import importlib
 import sys
 
-from novelutils.utils.crawler import NovelCrawler
-from novelutils.utils.epub import EpubMaker
-from novelutils.utils.file import FileConverter
-
 if sys.version_info >= (3, 8):
     from importlib import metadata
 else:
     import importlib_metadata as metadata
 __version__ = metadata.version(__name__)
 
+# Scrapy, Twisted and PIL take most of the startup time, so the public names
+# are imported on first access and subcommands import only what they need.
+_LAZY = {
+    "NovelCrawler": "novelutils.utils.crawler",
+    "crawl_batch": "novelutils.utils.crawler",
+    "EpubMaker": "novelutils.utils.epub",
+    "FileConverter": "novelutils.utils.file",
+}
+
+
+def __getattr__(name):
+    """Import the public names of the package on first access."""
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    """List the lazy names with the loaded ones."""
+    return sorted(set(globals()) | set(_LAZY))
+
 
 def main(argv) -> int:
     """Main program.
@@ -34,35 +54,100 @@ def main(argv) -> int:
     if args.version is True:
         print(f"Novelutils {__version__}")
         return 0
+    profiler = None
+    if args.profile is not None or args.cprofile is not None:
+        from novelutils.utils.profiler import enable
+
+        profiler = enable(args.cprofile)
     try:
-        args.func(args)
+        if profiler is None:
+            args.func(args)
+        else:
+            # the stages of the command are named after it, such as
+            # "command/convert", the command itself is named in the report
+            profiler.command = args.func.__name__[: -len("_func")]
+            with profiler.stage("command"):
+                args.func(args)
     except AttributeError:
         if argv[1] == "epub":
             print("Missing sub command: from_url, from_raw")
             return 1
+    finally:
+        if profiler is not None:
+            profiler.write(None if args.profile in (None, "-") else args.profile)
     return 0
 
 
 def crawl_func(args):
     """Run crawling process."""
+    from novelutils.utils.crawler import NovelCrawler, crawl_batch
+
+    if args.from_file is not None:
+        with open(args.from_file, encoding="utf-8") as f:
+            urls = [
+                line.strip() for line in f if line.strip() and line[0] != "#"
+            ]
+        crawl_batch(
+            urls,
+            rm_raw=not args.keep_raw,
+            start_chap=args.start,
+            stop_chap=args.stop,
+            clean=args.clean,
+            output=args.raw_dir,
+            concurrency=args.concurrency,
+            resume=args.resume,
+            cache=args.cache,
+            max_novels=args.max_novels,
+            domain_novels=args.domain_novels,
+            retry_failed=args.retry_failed,
+            packed=args.packed,
+            metrics_dir=args.metrics_dir,
+        )
+        return
+    if args.url is None:
+        raise NovelutilsException("Missing url or --from_file.")
     p = NovelCrawler(url=args.url)
     p.crawl(
         rm_raw=not args.keep_raw,
         start_chap=args.start,
         stop_chap=args.stop,
         clean=args.clean,
-        output=args.raw,
+        output=args.raw_dir,
+        concurrency=args.concurrency,
+        resume=args.resume,
+        cache=args.cache,
+        retry_failed=args.retry_failed,
+        packed=args.packed,
+        metrics_dir=args.metrics_dir,
     )
 
 
 def convert_func(args):
     """Convert process."""
-    c = FileConverter(args.raw_dir, args.result_dir)
-    c.convert_to_xhtml(
-        lang_code=args.lang_code,
-        duplicate_chapter=args.dup_chap,
-        rm_result=not args.keep_result,
-    )
+    from novelutils.utils.file import FileConverter
+
+    with FileConverter(args.raw_dir, args.result_dir) as c:
+        c.convert_to_xhtml(
+            lang_code=args.lang_code,
+            duplicate_chapter=args.dup_chap,
+            rm_result=not args.keep_result,
+            workers=args.jobs,
+            incremental=args.incremental,
+        )
+
+
+def pack_func(args):
+    """Pack raw files into a single store process."""
+    from novelutils.utils.rawstore import pack
+
+    pack(args.raw_dir)
+
+
+def unpack_func(args):
+    """Unpack raw files to one file per chapter process."""
+    from novelutils.utils.rawstore import unpack
+
+    unpack(args.raw_dir)
 
 
 def rm_dup_func(args):
@@ -73,23 +158,44 @@ def rm_dup_func(args):
      novelutils rm_dup --result_dir=.\result .\raw
 
     """
-    if args.result_dir is None:
-        c = FileConverter(args.raw_dir, args.raw_dir)
-    else:
-        c = FileConverter(args.raw_dir, args.result_dir)
-    c.clean(duplicate_chapter=True, rm_result=False)
+    from novelutils.utils.file import FileConverter
+
+    result_dir = args.raw_dir if args.result_dir is None else args.result_dir
+    with FileConverter(args.raw_dir, result_dir) as c:
+        c.clean(duplicate_chapter=True, rm_result=False, workers=args.jobs)
 
 
 def epub_from_url_func(args):
     """Make epub from url process."""
-    e = EpubMaker()
-    e.from_url(args.url, args.dup_chap, args.start, args.stop)
+    from novelutils.utils.epub import EpubMaker
+
+    e = EpubMaker(compression=args.compression)
+    e.from_url(
+        args.url,
+        args.dup_chap,
+        args.start,
+        args.stop,
+        args.cache,
+        args.jobs,
+        args.stream,
+        args.overlap,
+    )
 
 
 def epub_from_raw_func(args):
     """Make epub from raw process."""
-    e = EpubMaker()
-    e.from_raw(args.raw_dir, args.dup_chap, args.lang_code)
+    from novelutils.utils.epub import EpubMaker
+
+    e = EpubMaker(compression=args.compression, reuse_epub=args.reuse_epub)
+    e.from_raw(args.raw_dir, args.dup_chap, args.lang_code, args.jobs, args.stream)
+
+
+def update_func(args):
+    """Get new chapters and make epub again process."""
+    from novelutils.utils.epub import EpubMaker
+
+    e = EpubMaker(compression=args.compression)
+    e.update(args.raw_dir, args.dup_chap, args.cache, args.jobs)
 
 
 def _build_parser():
@@ -98,6 +204,7 @@ def _build_parser():
     Examples:
       $ novelutils crawl [start=1] [stop=-1] [rm_raw=True] [dup_chap=False] {url} [raw_dir=None]
       $ novelutils crawl https://bachngocsach.com/reader/livestream-sieu-kinh-di
+      $ novelutils crawl --from_file urls.txt
 
       $ novelutils convert [lang_code=vi] [dup_chap=False] [rm_result=True] {raw_dir} [result_dir=None]
       $ novelutils convert /home/user/raw
@@ -107,6 +214,9 @@ def _build_parser():
 
       $ novelutils epub from_raw [dup_chap=False] [lang_code=vi] {raw_dir}
       $ novelutils epub from_raw /home/user/raw
+
+      $ novelutils update [dup_chap=False] {raw_dir}
+      $ novelutils update /home/user/raw
     Returns:
       An ArgumentParser instance for the CLI.
     """
@@ -115,6 +225,20 @@ def _build_parser():
     parser.add_argument(
         "-v", "--version", action="store_true", help="show version number and exit"
     )
+    parser.add_argument(
+        "--profile",
+        default=None,
+        metavar="JSON_PATH",
+        help="report wall time, CPU time, bytes and files of every stage as JSON, "
+        'use "-" to print it to stderr',
+    )
+    parser.add_argument(
+        "--cprofile",
+        default=None,
+        metavar="STATS_DIR",
+        help="run cProfile in every stage, write the stats to this directory and "
+        "list the top functions in the profile report",
+    )
     subparsers = parser.add_subparsers(title="modes", help="supported modes")
     # crawl parser
     crawl = subparsers.add_parser("crawl", help="get novel text")
@@ -140,12 +264,75 @@ def _build_parser():
         type=str,
         default=None,
         metavar="RAW_PATH",
-        help="path to raw directory (default: working directory)",
+        help="path to raw directory, or to the directory holding all novels "
+        "with --from_file (default: working directory)",
     )
     crawl.add_argument(
         "--clean", action="store_false", help="clean all the text files after crawling."
     )
-    crawl.add_argument("url", type=str, help="full web site to novel info page")
+    crawl.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="maximum number of chapters downloaded at the same time "
+        "(default:  %(default)s)",
+    )
+    crawl.add_argument(
+        "--resume",
+        action="store_true",
+        help="if specified, keep raw directory and only get missing or truncated "
+        "chapters (default:  %(default)s)",
+    )
+    crawl.add_argument(
+        "--cache",
+        action="store_true",
+        help="if specified, keep responses and reuse them in later crawls "
+        "(default:  %(default)s)",
+    )
+    crawl.add_argument(
+        "--retry_failed",
+        action="store_true",
+        help="if specified, keep raw directory and only get chapters which failed "
+        "in previous crawls (default:  %(default)s)",
+    )
+    crawl.add_argument(
+        "--packed",
+        action="store_true",
+        help="if specified, store raw files in a single file instead of one file "
+        "per chapter (default:  %(default)s)",
+    )
+    crawl.add_argument(
+        "--metrics_dir",
+        type=str,
+        default=None,
+        metavar="METRICS_PATH",
+        help="write metrics of the crawl as JSON and Prometheus text files to this "
+        "directory every 10 seconds",
+    )
+    crawl.add_argument(
+        "--from_file",
+        type=str,
+        default=None,
+        metavar="URLS_PATH",
+        help="path to a text file with one novel url per line",
+    )
+    crawl.add_argument(
+        "--max_novels",
+        type=int,
+        default=4,
+        help="maximum number of novels downloaded at the same time with --from_file "
+        "(default:  %(default)s)",
+    )
+    crawl.add_argument(
+        "--domain_novels",
+        type=int,
+        default=1,
+        help="maximum number of novels downloaded at the same time from one web "
+        "site with --from_file (default:  %(default)s)",
+    )
+    crawl.add_argument(
+        "url", type=str, nargs="?", help="full web site to novel info page"
+    )
     crawl.set_defaults(func=crawl_func)
     # convert parser
     convert = subparsers.add_parser("convert", help="convert chapters to xhtml")
@@ -157,7 +344,8 @@ def _build_parser():
     convert.add_argument(
         "--dup_chap",
         action="store_true",
-        help="if specified, remove duplicate chapter title (default:  %(default)s)",
+        help="if specified, also remove the line after the chapter title when it "
+        "loosely repeats the title (default:  %(default)s)",
     )
     convert.add_argument(
         "--keep_result",
@@ -171,6 +359,18 @@ def _build_parser():
         metavar="RESULT_PATH",
         help="path to result directory (default: same parent as raw directory)",
     )
+    convert.add_argument(
+        "--incremental",
+        action="store_true",
+        help="if specified, only convert chapters changed since the last convert "
+        "(default:  %(default)s)",
+    )
+    convert.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes converting chapters (default:  %(default)s)",
+    )
     convert.add_argument("raw_dir", type=str, help="path to raw directory")
     convert.set_defaults(func=convert_func)
     # remove duplicate
@@ -182,8 +382,25 @@ def _build_parser():
         metavar="RESULT_PATH",
         help="path to result directory (default: replace files in raw directory)",
     )
+    rm_dup.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes cleaning chapters (default:  %(default)s)",
+    )
     rm_dup.add_argument("raw_dir", type=str, help="path to raw directory")
     rm_dup.set_defaults(func=rm_dup_func)
+    # pack and unpack raw files
+    pack = subparsers.add_parser(
+        "pack", help="store raw files in a single file instead of one file per chapter"
+    )
+    pack.add_argument("raw_dir", type=str, help="path to raw directory")
+    pack.set_defaults(func=pack_func)
+    unpack = subparsers.add_parser(
+        "unpack", help="store raw files as one file per chapter again"
+    )
+    unpack.add_argument("raw_dir", type=str, help="path to raw directory")
+    unpack.set_defaults(func=unpack_func)
     # epub parser
     epub = subparsers.add_parser("epub", help="make epub")
     subparsers_epub = epub.add_subparsers(title="modes", help="supported modes")
@@ -192,7 +409,8 @@ def _build_parser():
     from_url.add_argument(
         "--dup_chap",
         action="store_true",
-        help="if specified, remove duplicate chapter title (default:  %(default)s)",
+        help="if specified, also remove the line after the chapter title when it "
+        "loosely repeats the title (default:  %(default)s)",
     )
     from_url.add_argument(
         "--start",
@@ -206,6 +424,36 @@ def _build_parser():
         default=-1,
         help="stop chapter index, input -1 to get all chapters (default:  %(default)s)",
     )
+    from_url.add_argument(
+        "--cache",
+        action="store_true",
+        help="if specified, keep responses and reuse them in later crawls "
+        "(default:  %(default)s)",
+    )
+    from_url.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes converting chapters (default:  %(default)s)",
+    )
+    from_url.add_argument(
+        "--stream",
+        action="store_true",
+        help="if specified, write chapters straight to the epub without result "
+        "and epub directories (default:  %(default)s)",
+    )
+    from_url.add_argument(
+        "--overlap",
+        action="store_true",
+        help="if specified, convert chapters with --jobs processes while they are "
+        "downloaded (default:  %(default)s)",
+    )
+    from_url.add_argument(
+        "--compression",
+        choices=["fast", "balanced", "max"],
+        default="max",
+        help="compression profile of the epub (default:  %(default)s)",
+    )
     from_url.add_argument("url", type=str, help="full web site to novel info page")
     from_url.set_defaults(func=epub_from_url_func)
     # epub from_raw parser
@@ -215,15 +463,72 @@ def _build_parser():
     from_raw.add_argument(
         "--dup_chap",
         action="store_true",
-        help="if specified, remove duplicate chapter title (default:  %(default)s)",
+        help="if specified, also remove the line after the chapter title when it "
+        "loosely repeats the title (default:  %(default)s)",
     )
     from_raw.add_argument(
         "--lang_code",
         default="vi",
         help="language code of the novel (default: %(default)s)",
     )
+    from_raw.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes converting chapters (default:  %(default)s)",
+    )
+    from_raw.add_argument(
+        "--stream",
+        action="store_true",
+        help="if specified, write chapters straight to the epub without result "
+        "and epub directories (default:  %(default)s)",
+    )
+    from_raw.add_argument(
+        "--compression",
+        choices=["fast", "balanced", "max"],
+        default="max",
+        help="compression profile of the epub (default:  %(default)s)",
+    )
+    from_raw.add_argument(
+        "--reuse_epub",
+        action="store_true",
+        help="if specified, copy the members unchanged since the previous epub "
+        "without compressing them again (default:  %(default)s)",
+    )
     from_raw.add_argument("raw_dir", type=str, help="path to raw directory")
     from_raw.set_defaults(func=epub_from_raw_func)
+    # update parser
+    update = subparsers.add_parser(
+        "update", help="get new chapters and make epub again"
+    )
+    update.add_argument(
+        "--dup_chap",
+        action="store_true",
+        help="if specified, also remove the line after the chapter title when it "
+        "loosely repeats the title (default:  %(default)s)",
+    )
+    update.add_argument(
+        "--cache",
+        action="store_true",
+        help="if specified, keep responses and reuse them in later crawls "
+        "(default:  %(default)s)",
+    )
+    update.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes converting chapters (default:  %(default)s)",
+    )
+    update.add_argument(
+        "--compression",
+        choices=["fast", "balanced", "max"],
+        default="max",
+        help="compression profile of the epub (default:  %(default)s)",
+    )
+    update.add_argument(
+        "raw_dir", type=str, help="path to raw directory of the previous crawl"
+    )
+    update.set_defaults(func=update_func)
     return parser
 
 
@@ -0,0 +1,36 @@
+"""Define the HTTP cache policy for novel web sites.
+
+.. _See documentation in:
+   https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
+
+"""
+
+from scrapy.extensions.httpcache import RFC2616Policy
+
+
+class NovelCachePolicy(RFC2616Policy):
+    """Keep chapters forever and revalidate every other page.
+
+    Chapters (requests with ``meta["id"]``) rarely change once published, so
+    they are served from the cache without asking the server, unless
+    ``HTTPCACHE_IMMUTABLE_CHAPTERS`` is disabled. Info and toc pages change
+    whenever a chapter is added, so they are always revalidated with their
+    ETag or Last-Modified header.
+    """
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.immutable_chapters = settings.getbool("HTTPCACHE_IMMUTABLE_CHAPTERS", True)
+
+    def should_cache_response(self, response, request):
+        """Store every chapter, other pages follow RFC2616."""
+        if self.immutable_chapters and "id" in request.meta:
+            return response.status == 200
+        return super().should_cache_response(response, request)
+
+    def is_cached_response_fresh(self, cachedresponse, request):
+        """Chapters are always fresh, other pages need revalidation."""
+        if self.immutable_chapters and "id" in request.meta:
+            return True
+        self._set_conditional_validators(request, cachedresponse)
+        return False
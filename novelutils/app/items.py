@@ -19,5 +19,18 @@ class NovelInfo(Item):
 
 class Chapter(Item):
     """Store novel chapters."""
+    id = Field()
+    url = Field()
     chapter_title = Field()
     chapter_content = Field()
+
+
+class ChapterError(Item):
+    """Store the reason why a chapter could not be downloaded."""
+    id = Field()
+    reason = Field()
+
+
+class Cover(Item):
+    """Store novel cover image."""
+    image = Field()
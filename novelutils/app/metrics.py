@@ -0,0 +1,245 @@
+"""Define the crawl metrics extension.
+
+.. _See documentation in:
+   https://docs.scrapy.org/en/latest/topics/extensions.html
+
+"""
+import json
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+from novelutils.app.items import Chapter
+
+# upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+
+
+class CrawlMetrics:
+    """Write the metrics of a running crawl to a JSON and a Prometheus file.
+
+    Every ``METRICS_INTERVAL`` seconds and when the spider closes, the
+    extension writes ``<METRICS_NAME>.json`` and ``<METRICS_NAME>.prom`` in
+    ``METRICS_DIR``, the latter in the text format of the Prometheus node
+    exporter textfile collector. Files are replaced atomically so scrapers
+    never read a partial file.
+
+    Metrics are the request latency histogram of each domain, the number of
+    chapters downloaded and their rate, the bytes downloaded, the retries,
+    duplicate chapters and errors, and the time left estimated from the
+    chapters still pending.
+    """
+
+    def __init__(self, crawler, metrics_dir: Path, name: str, interval: float):
+        """Initialize the metrics.
+
+        Parameters
+        ----------
+        crawler : scrapy.crawler.Crawler
+            The crawler of the spider.
+        metrics_dir : Path
+            Directory of the metrics files.
+        name : str
+            Name of the metrics files and label of the novel.
+        interval : float
+            Seconds between two writes.
+        """
+        self.crawler = crawler
+        self.metrics_dir = metrics_dir
+        self.name = name
+        self.interval = interval
+        self.spider = None
+        self.start = None
+        self.chapters = 0
+        self.errors = 0
+        self.latency = {}  # domain: [count of each bucket, sum, count]
+        self.last = None  # time and chapters of the previous write
+        self.loop = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Create the extension if METRICS_DIR is set."""
+        settings = crawler.settings
+        metrics_dir = settings.get("METRICS_DIR")
+        if not metrics_dir:
+            raise NotConfigured
+        s = cls(
+            crawler,
+            Path(metrics_dir),
+            settings.get("METRICS_NAME") or crawler.spidercls.name,
+            settings.getfloat("METRICS_INTERVAL", 10.0),
+        )
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(s.response_received, signal=signals.response_received)
+        crawler.signals.connect(s.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(s.spider_error, signal=signals.spider_error)
+        return s
+
+    def spider_opened(self, spider):
+        """Start writing the metrics periodically."""
+        self.spider = spider
+        self.start = time.monotonic()
+        self.last = (self.start, 0)
+        self.metrics_dir.mkdir(parents=True, exist_ok=True)
+        self.loop = task.LoopingCall(self.write)
+        self.loop.start(self.interval, now=False)
+
+    def spider_closed(self, spider, reason):
+        """Write the final metrics."""
+        _ = spider, reason
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+        self.write()
+
+    def response_received(self, response, request, spider):
+        """Add the download latency of the response to its domain histogram."""
+        _ = spider
+        latency = request.meta.get("download_latency")
+        if latency is None:
+            return
+        domain = urlparse(response.url).hostname or ""
+        histogram = self.latency.get(domain)
+        if histogram is None:
+            histogram = self.latency[domain] = [[0] * len(LATENCY_BUCKETS), 0.0, 0]
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                histogram[0][i] += 1
+                break
+        histogram[1] += latency
+        histogram[2] += 1
+
+    def item_scraped(self, item, response, spider):
+        """Count the chapters downloaded."""
+        _ = response, spider
+        if isinstance(item, Chapter):
+            self.chapters += 1
+
+    def spider_error(self, failure, response, spider):
+        """Count the exceptions raised by the callbacks."""
+        _ = failure, response, spider
+        self.errors += 1
+
+    def collect(self) -> dict:
+        """Return the current metrics.
+
+        Returns
+        -------
+        dict
+            Counters, rates, ETA and latency histograms of the crawl.
+        """
+        stats = self.crawler.stats
+        now = time.monotonic()
+        elapsed = now - self.start
+        last_time, last_chapters = self.last
+        recent = (self.chapters - last_chapters) / max(now - last_time, 1e-9)
+        self.last = (now, self.chapters)
+        pending = len(getattr(self.spider, "pending", ()))
+        rate = self.chapters / elapsed if elapsed > 0 else 0.0
+        # the recent rate follows throttling, fall back to the mean at start
+        speed = recent or rate
+        return {
+            "novel": self.name,
+            "time": time.time(),
+            "elapsed_seconds": elapsed,
+            "toc_chapters": len(getattr(self.spider, "toc", ())),
+            "chapters": self.chapters,
+            "chapters_pending": pending,
+            "chapters_per_second": rate,
+            "recent_chapters_per_second": recent,
+            "eta_seconds": pending / speed if speed > 0 else None,
+            "response_bytes": stats.get_value("downloader/response_bytes", 0),
+            "requests": stats.get_value("downloader/request_count", 0),
+            "retries": stats.get_value("retry/count", 0),
+            "duplicates": stats.get_value("chapter/duplicate", 0),
+            "errors": (
+                self.errors
+                + stats.get_value("downloader/exception_count", 0)
+                + stats.get_value("chapter/failed", 0)
+            ),
+            "latency": {
+                domain: {
+                    "buckets": dict(zip(map(str, LATENCY_BUCKETS), counts)),
+                    "sum": total,
+                    "count": count,
+                }
+                for domain, (counts, total, count) in self.latency.items()
+            },
+        }
+
+    def write(self) -> None:
+        """Write the metrics files."""
+        metrics = self.collect()
+        _replace(
+            self.metrics_dir / f"{self.name}.json",
+            json.dumps(metrics, ensure_ascii=False, indent=2),
+        )
+        _replace(self.metrics_dir / f"{self.name}.prom", prometheus_text(metrics))
+
+
+def prometheus_text(metrics: dict) -> str:
+    """Format the metrics in the Prometheus text exposition format.
+
+    Parameters
+    ----------
+    metrics : dict
+        Metrics returned by ``CrawlMetrics.collect``.
+
+    Returns
+    -------
+    str
+        The metrics, one sample per line.
+    """
+    novel = _label(metrics["novel"])
+    lines = []
+    for key, kind, help_text in (
+        ("toc_chapters", "gauge", "Chapters in the table of contents."),
+        ("chapters", "counter", "Chapters downloaded."),
+        ("chapters_pending", "gauge", "Chapters requested but not downloaded."),
+        ("chapters_per_second", "gauge", "Mean rate of downloaded chapters."),
+        ("recent_chapters_per_second", "gauge", "Rate since the previous write."),
+        ("eta_seconds", "gauge", "Estimated seconds until all chapters are done."),
+        ("response_bytes", "counter", "Bytes of the downloaded responses."),
+        ("requests", "counter", "Requests sent."),
+        ("retries", "counter", "Requests retried."),
+        ("duplicates", "counter", "Chapters skipped as duplicates of another."),
+        ("errors", "counter", "Download errors, failed chapters and exceptions."),
+    ):
+        value = metrics[key]
+        if value is None:
+            continue
+        name = f"novelutils_{key}"
+        if kind == "counter":
+            name += "_total"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f'{name}{{novel="{novel}"}} {value}')
+    name = "novelutils_request_latency_seconds"
+    lines.append(f"# HELP {name} Download latency of the requests.")
+    lines.append(f"# TYPE {name} histogram")
+    for domain, histogram in metrics["latency"].items():
+        labels = f'novel="{novel}",domain="{_label(domain)}"'
+        cumulative = 0
+        for bound, count in histogram["buckets"].items():
+            cumulative += count
+            le = "+Inf" if bound == "inf" else bound
+            lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {histogram['sum']}")
+        lines.append(f"{name}_count{{{labels}}} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def _label(value: str) -> str:
+    """Escape a Prometheus label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _replace(path: Path, text: str) -> None:
+    """Write the file atomically."""
+    tmp = path.with_name(path.name + ".temp")
+    tmp.write_text(text, encoding="utf-8")
+    tmp.replace(path)
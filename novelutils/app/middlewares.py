@@ -4,7 +4,16 @@
    https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 """
 
+from email.utils import parsedate_to_datetime
+from time import time
+
 from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
+from twisted.internet import defer, error, reactor
+from twisted.internet.task import deferLater
+
+TIMEOUT_EXCEPTIONS = (defer.TimeoutError, error.TimeoutError, error.TCPTimedOutError)
 
 
 class AppSpiderMiddleware:
@@ -65,21 +74,49 @@ class AppSpiderMiddleware:
 
 
 class AppDownloaderMiddleware:
-    """Not all methods need to be defined. If a method is not defined,
-    scrapy acts as if the downloader middleware does not modify the
-    passed objects.
+    """Adjust the concurrency of every domain with an AIMD controller.
+
+    The window of a domain grows by about one request per round trip while
+    latency stays under the target and errors are rare, and is cut by
+    ``ADAPTIVE_CONCURRENCY_BACKOFF`` on 429/503 responses and timeouts. A
+    Retry-After header pauses new requests to the domain until it expires.
+    The window is applied to the downloader slot of the domain and written
+    to the crawl stats as ``adaptive/<domain>/window``.
     """
 
+    def __init__(self, crawler):
+        """Read the controller settings."""
+        settings = crawler.settings
+        self.crawler = crawler
+        self.start = settings.getfloat("ADAPTIVE_CONCURRENCY_START", 2)
+        self.min = settings.getfloat("ADAPTIVE_CONCURRENCY_MIN", 1)
+        self.max = settings.getfloat(
+            "ADAPTIVE_CONCURRENCY_MAX",
+            settings.getint("CONCURRENT_REQUESTS_PER_DOMAIN"),
+        )
+        self.target_latency = settings.getfloat(
+            "ADAPTIVE_CONCURRENCY_TARGET_LATENCY", 2.0
+        )
+        self.max_error_rate = settings.getfloat(
+            "ADAPTIVE_CONCURRENCY_MAX_ERROR_RATE", 0.1
+        )
+        self.backoff = settings.getfloat("ADAPTIVE_CONCURRENCY_BACKOFF", 0.5)
+        self.max_retry_after = settings.getfloat(
+            "ADAPTIVE_CONCURRENCY_MAX_RETRY_AFTER", 300
+        )
+        self.domains = {}
+
     @classmethod
     def from_crawler(cls, crawler):
         """This method is used by Scrapy to create your spiders."""
-        s = cls()
+        if not crawler.settings.getbool("ADAPTIVE_CONCURRENCY_ENABLED"):
+            raise NotConfigured
+        s = cls(crawler)
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
         return s
 
     def process_request(self, request, spider):
-        """Called for each request that goes through the downloader
-        middleware.
+        """Wait until the Retry-After of the domain expires.
 
         Must either:
         - return None: continue processing this request
@@ -88,32 +125,116 @@ class AppDownloaderMiddleware:
         - or raise IgnoreRequest: process_exception() methods of
           installed downloader middleware will be called
           """
-        _ = (self, request, spider)
+        _ = spider
+        state = self._get_state(request)
+        self._apply(request, state)
+        delay = state.resume_at - time()
+        if delay > 0:
+            return deferLater(reactor, delay, lambda: None)
         return None
 
     def process_response(self, request, response, spider):
-        """Called with the response returned from the downloader.
+        """Grow the window on healthy responses, shrink it on throttling.
 
         Must either;
         - return a Response object
         - return a Request object
         - or raise IgnoreRequest
         """
-        _ = (self, request, spider)
+        state = self._get_state(request)
+        if response.status in (429, 503):
+            self._decrease(request, state, spider)
+            retry_after = _parse_retry_after(response.headers.get(b"Retry-After"))
+            if retry_after is not None:
+                state.resume_at = time() + min(retry_after, self.max_retry_after)
+                spider.logger.info(
+                    "%s asks to retry after %ss", state.key, retry_after
+                )
+        else:
+            state.record(request.meta.get("download_latency", 0.0), failed=False)
+            if (
+                state.latency <= self.target_latency
+                and state.error_rate <= self.max_error_rate
+            ):
+                state.window = min(self.max, state.window + 1 / state.window)
+        self._apply(request, state)
         return response
 
     def process_exception(self, request, exception, spider):
-        """Called when a download handler or a process_request()
-        (from other downloader middleware) raises an exception.
+        """Shrink the window on timeouts.
 
         Must either:
         - return None: continue processing this exception
         - return a Response object: stops process_exception() chain
         - return a Request object: stops process_exception() chain
         """
-        pass
+        if isinstance(exception, TIMEOUT_EXCEPTIONS):
+            state = self._get_state(request)
+            self._decrease(request, state, spider)
+            self._apply(request, state)
 
     def spider_opened(self, spider):
         """Log spider information."""
         _ = self
         spider.logger.info('Spider opened: %s' % spider.name)
+
+    def _get_state(self, request):
+        """Return the controller state of the domain of the request."""
+        key = request.meta.get("download_slot")
+        if key is None:
+            key = urlparse_cached(request).hostname
+        if key not in self.domains:
+            self.domains[key] = DomainState(key, self.start)
+        return self.domains[key]
+
+    def _decrease(self, request, state, spider):
+        """Cut the window, at most once per round trip."""
+        state.record(request.meta.get("download_latency", 0.0), failed=True)
+        now = time()
+        if now - state.decreased_at < max(state.latency, 1.0):
+            # responses of requests sent before the last cut
+            return
+        state.decreased_at = now
+        state.window = max(self.min, state.window * self.backoff)
+        self.crawler.stats.inc_value(f"adaptive/{state.key}/backoff", spider=spider)
+
+    def _apply(self, request, state):
+        """Set the window to the downloader slot and the stats."""
+        slots = self.crawler.engine.downloader.slots
+        key = request.meta.get("download_slot") or state.key
+        if key in slots:
+            slots[key].concurrency = int(state.window)
+        stats = self.crawler.stats
+        stats.set_value(f"adaptive/{state.key}/window", int(state.window))
+        stats.max_value(f"adaptive/{state.key}/max_window", int(state.window))
+
+
+class DomainState:
+    """Store the controller state of a domain."""
+
+    def __init__(self, key: str, window: float):
+        """Initialize the state with the start window."""
+        self.key = key
+        self.window = window
+        self.latency = 0.0  # moving average of download latency
+        self.error_rate = 0.0  # moving average of errors
+        self.decreased_at = 0.0
+        self.resume_at = 0.0
+
+    def record(self, latency: float, failed: bool) -> None:
+        """Update the moving averages with a response."""
+        self.latency = 0.8 * self.latency + 0.2 * latency
+        self.error_rate = 0.9 * self.error_rate + (0.1 if failed else 0.0)
+
+
+def _parse_retry_after(value):
+    """Return seconds to wait from a Retry-After header, None if invalid."""
+    if not value:
+        return None
+    value = value.decode("latin-1").strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time())
+    except (TypeError, ValueError):
+        return None
@@ -5,12 +5,338 @@
 
    useful for handling different item types with a single interface
 """
+import logging
+
+from typing import Optional, Tuple
+
+from twisted.internet import defer, reactor, threads
+from twisted.python.threadpool import ThreadPool
+
+from novelutils.app.items import Chapter, ChapterError, Cover, NovelInfo
+from novelutils.utils.dedup import DuplicateIndex
+from novelutils.utils.ledger import Ledger
+from novelutils.utils.manifest import Manifest, chapter_entry, duplicate_entry
+from novelutils.utils.rawstore import RawSource, open_raw
+
+_logger = logging.getLogger(__name__)
 
 
 class AppPipeline:
-    """Define App pipeline."""
+    """Write items to the raw directory of the spider from a thread pool.
+
+    Items go to the packed store of the raw directory if it has one, else to
+    one file per item.
+
+    Items are grouped in batches and each batch is written by a worker
+    thread, so the reactor never waits for the disk. When ``max_pending``
+    batches are being written, ``process_item`` returns a deferred which
+    fires only after one of them is done, which makes Scrapy stop feeding
+    new responses until the disk catches up.
+
+    With ``CHAPTER_DEDUP``, chapters whose text is the same as a chapter
+    saved before, or nearly the same with ``CHAPTER_DEDUP_SIMILARITY``, are
+    not written, they are reported to the spider as duplicates. The chapter
+    with the lowest id is kept: a chapter written before a lower duplicate
+    of it is removed once all batches are written.
+
+    Writer threads also append the manifest lines of the chapters and update
+    the ledger, with the chapters saved and the ``ChapterError`` items of the
+    failed downloads. The spider is only told about them in the reactor
+    thread.
+    """
+
+    def __init__(
+        self,
+        threads_num: int,
+        batch_size: int,
+        max_pending: int,
+        flush_delay: float,
+        dedup: bool = True,
+        similarity: Optional[float] = None,
+    ):
+        """Initialize the writer.
+
+        Parameters
+        ----------
+        threads_num : int
+            Number of writer threads.
+        batch_size : int
+            Number of items written by a thread at once.
+        max_pending : int
+            Number of batches which may be written at the same time before
+            applying backpressure.
+        flush_delay : float
+            Seconds an incomplete batch may wait before being written.
+        dedup : bool, optional
+            If specified, skip duplicate chapters, by default True.
+        similarity : float, optional
+            Share of paragraphs two chapters need in common to be near
+            duplicates, by default None to only skip exact duplicates.
+        """
+        self.pool = ThreadPool(minthreads=1, maxthreads=threads_num, name="AppPipeline")
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.flush_delay = flush_delay
+        self.batch = []
+        self.flush_call = None
+        self.pending = set()  # deferreds of batches being written
+        self.waiting = []  # (deferred, item) returned to scrapy, not fired yet
+        self.raw = None  # raw files of the spider
+        self.dedup = DuplicateIndex(similarity) if dedup else None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Create the pipeline from the crawler settings."""
+        settings = crawler.settings
+        similarity = settings.get("CHAPTER_DEDUP_SIMILARITY")
+        return cls(
+            threads_num=settings.getint("WRITER_THREADS", 4),
+            batch_size=settings.getint("WRITER_BATCH_SIZE", 16),
+            max_pending=settings.getint("WRITER_MAX_PENDING", 8),
+            flush_delay=settings.getfloat("WRITER_FLUSH_DELAY", 1.0),
+            dedup=settings.getbool("CHAPTER_DEDUP", True),
+            similarity=None if similarity is None else float(similarity),
+        )
+
+    def open_spider(self, spider):
+        """Open the raw files and start the writer threads.
+
+        Chapters kept from a previous crawl are added to the duplicate index.
+        """
+        self.raw = open_raw(spider.save_path)
+        if self.dedup is not None and (spider.resume or spider.retry_failed):
+            for chap_id in self.raw.chapter_ids():
+                self.dedup.add(chap_id, self.raw.read_chapter(chap_id))
+        self.pool.start()
+
+    def close_spider(self, spider):
+        """Write the last batch and wait for all writes to finish."""
+        self._flush(spider)
+        d = defer.DeferredList(list(self.pending))
+        if self.dedup is not None:
+            # no batch may write a replaced chapter after it is removed
+            d.addCallback(
+                lambda _: threads.deferToThreadPool(
+                    reactor, self.pool, self._drop_replaced, spider
+                )
+            )
+            d.addCallback(self._replaced_recorded, spider)
+            d.addErrback(
+                lambda f: spider.logger.error(
+                    "Failed to remove duplicate chapters: %s", f.value
+                )
+            )
+        d.addBoth(self._stop)
+        return d
+
+    def _stop(self, _):
+        """Stop the writer threads and close the raw files."""
+        self.pool.stop()
+        self.raw.close()
 
     def process_item(self, item, spider):
-        """Process logic."""
-        _ = self, spider
-        return item
+        """Add the item to the current batch."""
+        self.batch.append(item)
+        if len(self.batch) >= self.batch_size:
+            self._flush(spider)
+        elif self.flush_call is None:
+            self.flush_call = reactor.callLater(self.flush_delay, self._flush, spider)
+        if len(self.pending) < self.max_pending:
+            return item
+        d = defer.Deferred()
+        self.waiting.append((d, item))
+        return d
+
+    def _flush(self, spider):
+        """Send the current batch to a writer thread."""
+        if self.flush_call is not None:
+            if self.flush_call.active():
+                self.flush_call.cancel()
+            self.flush_call = None
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        d = threads.deferToThreadPool(reactor, self.pool, self._write, batch, spider)
+        self.pending.add(d)
+        d.addCallback(self._batch_written, spider)
+        d.addErrback(
+            lambda f: spider.logger.error("Failed to write items: %s", f.value)
+        )
+        d.addBoth(self._release, d)
+
+    def _write(self, batch, spider):
+        """Write the batch and record its chapters, run in a writer thread."""
+        written, failed = write_batch(batch, self.raw, self.dedup)
+        return record_chapters(
+            written, failed, spider.toc, spider.manifest, spider.ledger
+        )
+
+    def _drop_replaced(self, spider):
+        """Remove and record the replaced chapters, run in a writer thread."""
+        replaced, repointed = drop_replaced(self.raw, self.dedup)
+        return [
+            record_chapters(
+                [(chap_id, None, original) for chap_id, original in chapters.items()],
+                [],
+                spider.toc,
+                spider.manifest,
+                spider.ledger,
+            )
+            for chapters in (replaced, repointed)
+        ]
+
+    def _replaced_recorded(self, recorded, spider):
+        """Report the replaced chapters, update the entries of the repointed."""
+        replaced, repointed = recorded
+        self._batch_written(replaced, spider)
+        # already reported as duplicates, only their original changed
+        for entry, _ in repointed[0]:
+            spider.manifest.entries[entry["id"]] = entry
+
+    def _batch_written(self, recorded, spider):
+        """Report the saved, the duplicate and the failed chapters to the spider."""
+        saved, failed = recorded
+        for entry, content in saved:
+            if "duplicate_of" in entry:
+                spider.chapter_duplicate(entry)
+            else:
+                spider.chapter_done(entry, content)
+        for chap_id, reason, attempts in failed:
+            spider.chapter_error(chap_id, reason, attempts)
+
+    def _release(self, _, d):
+        """Fire the deferreds waiting for a free slot."""
+        self.pending.discard(d)
+        while self.waiting and len(self.pending) < self.max_pending:
+            waiting, item = self.waiting.pop(0)
+            waiting.callback(item)
+
+
+def write_batch(
+    batch: list, raw: RawSource, dedup: DuplicateIndex = None
+) -> Tuple[list, list]:
+    """Write items to the raw files, run in a writer thread.
+
+    An item which cannot be converted to its raw file is skipped, the others
+    are still written.
+
+    Parameters
+    ----------
+    batch : list
+        Items to write.
+    raw : RawSource
+        Raw directory or packed store of the spider.
+    dedup : DuplicateIndex, optional
+        If specified, chapters it finds duplicate are not written,
+        by default None.
+
+    Returns
+    -------
+    Tuple[list, list]
+        Id, content and id of the duplicated chapter of the chapters, the
+        last is None for the chapters written. Id and reason of the chapters
+        which could not be written or downloaded.
+    """
+    written = []
+    failed = []
+    files = []
+    for item in batch:
+        try:
+            if isinstance(item, Chapter):
+                lines = [item["chapter_title"]]
+                lines.extend(item["chapter_content"])
+                text = "\n".join([x.strip() for x in lines if x.strip() != ""])
+                content = text.encode("utf-8")
+                original = None if dedup is None else dedup.check(item["id"], content)
+                if original is None:
+                    files.append((f'{item["id"]}.txt', content))
+                written.append((item["id"], content, original))
+            elif isinstance(item, NovelInfo):
+                info = [item["title"], item["author"], item["url"], item["types"]]
+                info.extend(item["foreword"])
+                files.append(("foreword.txt", "\n".join(info).encode("utf-8")))
+            elif isinstance(item, Cover):
+                files.append(("cover.jpg", item["image"]))
+            elif isinstance(item, ChapterError):
+                failed.append((item["id"], item["reason"]))
+        except Exception as e:  # one broken item must not lose the batch
+            reason = f"{type(e).__name__}: {e}"
+            if isinstance(item, Chapter) and isinstance(item.get("id"), int):
+                failed.append((item["id"], reason))
+            else:
+                _logger.error("Failed to write %s: %s", type(item).__name__, reason)
+    raw.write_many(files)
+    return written, failed
+
+
+def drop_replaced(raw: RawSource, dedup: DuplicateIndex) -> Tuple[dict, dict]:
+    """Remove the chapters replaced by a lower duplicate, run in a writer thread.
+
+    Parameters
+    ----------
+    raw : RawSource
+        Raw directory or packed store of the spider.
+    dedup : DuplicateIndex
+        Duplicate index of the crawl.
+
+    Returns
+    -------
+    Tuple[dict, dict]
+        Id of the removed chapters and id of the chapter kept instead. Id of
+        the duplicates reported with a removed chapter as original and id of
+        the chapter kept instead.
+    """
+    replaced = dict(sorted(dedup.replaced.items()))
+    raw.delete_many(f"{chap_id}.txt" for chap_id in replaced)
+    repointed = {
+        chap_id: replaced[original]
+        for chap_id, original in sorted(dedup.originals.items())
+        if original in replaced
+    }
+    return replaced, repointed
+
+
+def record_chapters(
+    written: list, failed: list, toc: list, manifest: Manifest, ledger: Ledger
+) -> Tuple[list, list]:
+    """Record the chapters in the manifest file and the ledger.
+
+    Run in a writer thread, the entries in memory are left to the spider.
+
+    Parameters
+    ----------
+    written : list
+        Id, content and id of the duplicated chapter of the chapters, as
+        returned by write_batch.
+    failed : list
+        Id and reason of the chapters which could not be saved.
+    toc : list
+        Links of the chapters of the spider.
+    manifest : Manifest
+        Manifest of the raw directory.
+    ledger : Ledger
+        Ledger of the raw directory.
+
+    Returns
+    -------
+    Tuple[list, list]
+        Manifest entry and content of the chapters. Id, reason and number of
+        attempts of the failed chapters.
+    """
+    recorded = []
+    for chap_id, content, original in written:
+        url = toc[chap_id - 1]
+        if original is None:
+            entry = chapter_entry(chap_id, url, content)
+        else:
+            entry = duplicate_entry(chap_id, url, original, "content")
+        recorded.append((entry, content))
+    if recorded:
+        manifest.append([entry for entry, _ in recorded])
+        ledger.done_many(entry["id"] for entry, _ in recorded)
+    attempts = ledger.fail_many(
+        (chap_id, toc[chap_id - 1], reason) for chap_id, reason in failed
+    )
+    return recorded, [
+        (chap_id, reason, n) for (chap_id, reason), n in zip(failed, attempts)
+    ]
@@ -49,9 +49,9 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-# DOWNLOADER_MIDDLEWARES = {
-#    'app.middlewares.AppDownloaderMiddleware': 543,
-# }
+DOWNLOADER_MIDDLEWARES = {
+   'app.middlewares.AppDownloaderMiddleware': 560,
+}
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -61,9 +61,9 @@ ROBOTSTXT_OBEY = True
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-# ITEM_PIPELINES = {
-#    'app.pipelines.AppPipeline': 300,
-# }
+ITEM_PIPELINES = {
+   'app.pipelines.AppPipeline': 300,
+}
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -89,6 +89,7 @@ ROBOTSTXT_OBEY = True
 
 # Custom
 AUTOTHROTTLE_ENABLED = True
+ADAPTIVE_CONCURRENCY_ENABLED = True
 DEFAULT_REQUEST_HEADERS = {
     'Accept':
         'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
@@ -0,0 +1,343 @@
+"""Define the base spider for novel web sites."""
+
+from pathlib import Path
+from typing import Callable, Iterator, List
+
+import scrapy
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
+from scrapy.spidermiddlewares.httperror import HttpError
+from twisted.internet import reactor
+from w3lib.url import canonicalize_url
+
+from novelutils.app.items import ChapterError
+from novelutils.utils.ledger import Ledger
+from novelutils.utils.manifest import Manifest, duplicate_entry
+
+
+class NovelSpider(scrapy.Spider):
+    """Base spider which requests every chapter of the toc at once.
+
+    Subclasses extract the novel info in ``parse``, fill ``self.toc`` with the
+    chapter links and then yield from ``request_chapters``. Chapters are
+    scheduled together, so they arrive out of order and are saved by
+    ``meta["id"]``. The spider closes by itself once the range is done.
+
+    Spiders only yield items, ``AppPipeline`` writes them to ``save_path``.
+
+    Chapters which still fail after the retry middleware are written to the
+    ledger of the raw directory. When the spider becomes idle they are
+    requested again after ``CHAPTER_RETRY_BACKOFF`` seconds, doubled on each
+    round, up to ``CHAPTER_RETRY_ROUNDS`` rounds. Chapters left in the ledger
+    can be crawled later with ``retry_failed``.
+
+    ``aliases`` lists mirror domains served by the same spider, the registry
+    maps them to the spider as well as ``name`` and ``allowed_domains``.
+    """
+
+    aliases: List[str] = []
+
+    def __init__(
+        self,
+        url: str,
+        save_path: Path,
+        start_chap: int,
+        stop_chap: int,
+        *args,
+        resume: bool = False,
+        retry_failed: bool = False,
+        on_chapter: Callable[[int, bytes], None] = None,
+        **kwargs,
+    ):
+        """Initialize the attributes for this spider.
+
+        Parameters
+        ----------
+        url : str
+            The link of the novel information page.
+        save_path : Path
+            Path of raw directory.
+        start_chap : int
+            Start crawling from this chapter.
+        stop_chap : int
+            Stop crawling from this chapter, input -1 to get all chapters.
+        resume : bool, optional
+            If specified, skip chapters already downloaded, by default False.
+        retry_failed : bool, optional
+            If specified, only request chapters in the ledger, by default False.
+        on_chapter : Callable[[int, bytes], None], optional
+            Called in the reactor thread with the id and content of each
+            chapter as soon as it is saved, by default None.
+        """
+        super().__init__(*args, **kwargs)
+        self.start_urls = [url]
+        self.save_path = save_path
+        self.start_chap = start_chap
+        self.stop_chap = stop_chap
+        self.resume = resume
+        self.retry_failed = retry_failed
+        self.on_chapter = on_chapter
+        self.manifest = Manifest(save_path)
+        self.ledger = Ledger(save_path)
+        self.toc = []
+        self.pending = set()  # id of chapters requested but not saved yet
+        self.failed = set()  # id of chapters waiting for the next retry round
+        self.retry_round = 0
+        self.retry_call = None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        """Create the spider and listen to the idle signal to retry chapters."""
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
+        return spider
+
+    def request_chapters(
+        self, response: scrapy.http.Response
+    ) -> Iterator[scrapy.Request]:
+        """Request all chapters from start chapter to stop chapter.
+
+        Lower ids get higher priority, so chapters are downloaded roughly in
+        order while still running concurrently. When resuming, chapters which
+        are valid in the manifest are skipped. When retrying failed chapters,
+        only chapters in the ledger are requested. With ``CHAPTER_DEDUP``,
+        a chapter whose link is the link of a lower chapter in the range is
+        recorded as its duplicate without being requested.
+
+        Parameters
+        ----------
+        response : scrapy.http.Response
+            The response of the toc page, used as referer.
+
+        Yields
+        ------
+        scrapy.Request
+            Request to each chapter in the range.
+        """
+        stop_chap = len(self.toc)
+        if self.stop_chap != -1:
+            stop_chap = min(self.stop_chap, stop_chap)
+        if self.start_chap > stop_chap:
+            self.logger.warning(
+                "Start chapter %s is out of the toc (%s chapters).",
+                self.start_chap,
+                len(self.toc),
+            )
+            return
+        self.logger.info("Request chapters from %s to %s.", self.start_chap, stop_chap)
+        skip = self.manifest.valid_ids() if self.resume else set()
+        if skip:
+            self.logger.info("Skip %s chapters already downloaded.", len(skip))
+        chap_ids = range(self.start_chap, stop_chap + 1)
+        first = {}  # canonical link: first chapter with this link
+        if self.settings.getbool("CHAPTER_DEDUP", True):
+            for chap_id in chap_ids:
+                first.setdefault(canonicalize_url(self.toc[chap_id - 1]), chap_id)
+        if self.retry_failed:
+            chap_ids = [x for x in self.ledger.ids() if x in chap_ids]
+            self.logger.info("Retry %s failed chapters.", len(chap_ids))
+        chap_ids = [x for x in chap_ids if x not in skip]
+        duplicates = {}  # id: manifest entry of chapters linking a lower one
+        for chap_id in chap_ids:
+            url = self.toc[chap_id - 1]
+            original = first.get(canonicalize_url(url), chap_id)
+            if original != chap_id:
+                duplicates[chap_id] = duplicate_entry(chap_id, url, original, "link")
+        if duplicates:
+            # written at once, saved chapters are recorded by the pipeline
+            self.manifest.append(list(duplicates.values()))
+            self.ledger.done_many(duplicates)
+        for entry in duplicates.values():
+            self.chapter_duplicate(entry)
+        for chap_id in chap_ids:
+            if chap_id in duplicates:
+                continue
+            self.pending.add(chap_id)
+            yield self.chapter_request(chap_id, response.url)
+
+    def chapter_request(
+        self, chap_id: int, referer: str, dont_filter: bool = False
+    ) -> scrapy.Request:
+        """Return the request of the chapter.
+
+        Parameters
+        ----------
+        chap_id : int
+            Id of the chapter.
+        referer : str
+            Link of the toc page.
+        dont_filter : bool, optional
+            If specified, bypass the duplicate filter, by default False.
+
+        Returns
+        -------
+        scrapy.Request
+            Request to the chapter.
+        """
+        return scrapy.Request(
+            url=self.toc[chap_id - 1],
+            headers={"Referer": referer},
+            meta={"id": chap_id},
+            priority=-chap_id,
+            callback=self.parse_content,
+            errback=self.chapter_failed,
+            dont_filter=dont_filter,
+        )
+
+    def chapter_failed(self, failure) -> Iterator[ChapterError]:
+        """Send the failed chapter to the ledger and retry it later.
+
+        The pipeline records it in the ledger from a writer thread, then
+        reports it with ``chapter_error``.
+
+        Parameters
+        ----------
+        failure : twisted.python.failure.Failure
+            The failure of the chapter request.
+
+        Yields
+        ------
+        ChapterError
+            Id of the chapter and the reason of the failure.
+        """
+        chap_id = failure.request.meta["id"]
+        if failure.check(HttpError):
+            reason = f"HTTP {failure.value.response.status}"
+        else:
+            reason = f"{failure.type.__name__}: {failure.getErrorMessage()}"
+        self.failed.add(chap_id)
+        yield ChapterError(id=chap_id, reason=reason)
+
+    def spider_idle(self) -> None:
+        """Schedule the next retry round of failed chapters.
+
+        Raises
+        ------
+        DontCloseSpider
+            While a retry round is scheduled.
+        """
+        if self.retry_call is not None and self.retry_call.active():
+            raise DontCloseSpider
+        max_rounds = self.settings.getint("CHAPTER_RETRY_ROUNDS", 3)
+        if not self.failed or self.retry_round >= max_rounds:
+            return
+        delay = self.settings.getfloat("CHAPTER_RETRY_BACKOFF", 10.0)
+        delay *= 2 ** self.retry_round
+        self.retry_round += 1
+        self.logger.info(
+            "Retry %s failed chapters in %s seconds (round %s/%s).",
+            len(self.failed),
+            delay,
+            self.retry_round,
+            max_rounds,
+        )
+        self.retry_call = reactor.callLater(delay, self._requeue)
+        raise DontCloseSpider
+
+    def _requeue(self) -> None:
+        """Request the failed chapters again."""
+        failed, self.failed = sorted(self.failed), set()
+        for chap_id in failed:
+            request = self.chapter_request(
+                chap_id, self.start_urls[0], dont_filter=True
+            )
+            self.crawler.engine.crawl(request, self)
+
+    def parse_content(self, response: scrapy.http.Response):
+        """Extract the content of chapter.
+
+        Subclasses must yield a ``Chapter`` item with the id of the chapter.
+
+        Parameters
+        ----------
+        response : Response
+            The response to parse.
+        """
+        raise NotImplementedError(
+            f"{self.__class__.__name__}.parse_content callback is not defined"
+        )
+
+    def chapter_done(self, entry: dict, content: bytes) -> None:
+        """Mark the chapter as saved.
+
+        The pipeline already wrote its manifest line and removed it from the
+        ledger from a writer thread, only the entries in memory are updated.
+
+        Parameters
+        ----------
+        entry : dict
+            Manifest entry of the chapter.
+        content : bytes
+            Content written to the chapter file.
+        """
+        chap_id = entry["id"]
+        self.pending.discard(chap_id)
+        self.manifest.entries[chap_id] = entry
+        if self.on_chapter is not None:
+            self.on_chapter(chap_id, content)
+
+    def chapter_error(self, chap_id: int, reason: str, attempts: int) -> None:
+        """Report the chapter the pipeline recorded in the ledger.
+
+        Parameters
+        ----------
+        chap_id : int
+            Id of the chapter.
+        reason : str
+            Why the chapter could not be saved.
+        attempts : int
+            Number of attempts of the chapter so far.
+        """
+        self.crawler.stats.inc_value("chapter/failed")
+        self.logger.warning(
+            "Chapter %s failed (%s), attempt %s.", chap_id, reason, attempts
+        )
+
+    def chapter_duplicate(self, entry: dict) -> None:
+        """Mark the chapter as a duplicate of another one, it is not saved.
+
+        Its manifest line and its removal from the ledger are written by the
+        caller, see chapter_done.
+
+        Parameters
+        ----------
+        entry : dict
+            Manifest entry of the chapter, with the id of the chapter with
+            the same link or content in "duplicate_of".
+        """
+        chap_id = entry["id"]
+        self.pending.discard(chap_id)
+        self.manifest.entries[chap_id] = entry
+        self.crawler.stats.inc_value("chapter/duplicate")
+        self.logger.info(
+            "Chapter %s is a duplicate of chapter %s, skipped.",
+            chap_id,
+            entry["duplicate_of"],
+        )
+
+    def closed(self, reason: str) -> None:
+        """Report chapters which were requested but never saved.
+
+        The manifest is closed, the pipeline was closed before.
+
+        Parameters
+        ----------
+        reason : str
+            The reason why the spider was closed.
+        """
+        if self.retry_call is not None and self.retry_call.active():
+            self.retry_call.cancel()
+        self.manifest.close()
+        if self.pending:
+            self.logger.warning(
+                "Spider closed (%s) with %s chapters missing: %s",
+                reason,
+                len(self.pending),
+                sorted(self.pending),
+            )
+        if self.ledger.entries:
+            self.logger.warning(
+                "%s chapters failed, see %s and crawl again with retry_failed.",
+                len(self.ledger.entries),
+                self.ledger.p,
+            )
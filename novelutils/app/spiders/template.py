@@ -4,45 +4,17 @@
    https://example.com
 
 """
-from pathlib import Path
-
 import scrapy
 
+from novelutils.app.items import Chapter, Cover, NovelInfo
+from novelutils.app.spiders.base import NovelSpider
+
 
-class DemoSpider(scrapy.Spider):
+class DemoSpider(NovelSpider):
     """Define spider for domain: demo."""
 
     name = "example"
 
-    def __init__(
-        self,
-        url: str,
-        save_path: Path,
-        start_chap: int,
-        stop_chap: int,
-        *args,
-        **kwargs,
-    ):
-        """Initialize the attributes for this spider.
-
-        Parameters
-        ----------
-        url : str
-            The link of the novel information page.
-        save_path : Path
-            Path of raw directory.
-        start_chap : int
-            Start crawling from this chapter.
-        stop_chap : int
-            Stop crawling from this chapter, input -1 to get all chapters.
-        """
-        super().__init__(*args, **kwargs)
-        self.start_urls = [url]
-        self.save_path = save_path
-        self.start_chap = start_chap
-        self.stop_chap = stop_chap
-        self.toc = []
-
     def parse(self, response: scrapy.http.Response, **kwargs):
         """Extract info of the novel and get the link of the
         table of content (toc).
@@ -56,13 +28,15 @@ class DemoSpider(scrapy.Spider):
         ------
         Request
             Request to the cover image page and toc page.
+        NovelInfo
+            Info of the novel.
         """
         # download cover
         yield scrapy.Request(
             url=response.xpath('//*[@id="cover"]/img/@src').get(),
             callback=self.parse_cover,
         )
-        get_info(response, self.save_path)
+        yield get_info(response)
         toc_link = "https://example.com/toc"
         yield scrapy.Request(url=toc_link, callback=self.parse_link)
 
@@ -73,11 +47,16 @@ class DemoSpider(scrapy.Spider):
         ----------
         response : Response
             The response to parse.
+
+        Yields
+        ------
+        Cover
+            The cover image.
         """
-        (self.save_path / "cover.jpg").write_bytes(response.body)
+        yield Cover(image=response.body)
 
     def parse_link(self, response: scrapy.http.Response):
-        """Extract link of the start chapter.
+        """Extract links of all chapters.
 
         Parameters
         ----------
@@ -87,7 +66,7 @@ class DemoSpider(scrapy.Spider):
         Yields
         ------
         scrapy.Request
-            Request to the start chapter.
+            Request to each chapter from start chapter to stop chapter.
         """
         self.toc.extend(
             [
@@ -97,11 +76,7 @@ class DemoSpider(scrapy.Spider):
                 ).getall()
             ]
         )
-        yield scrapy.Request(
-            url=self.toc[self.start_chap - 1],
-            meta={"id": self.start_chap},
-            callback=self.parse_content,
-        )
+        yield from self.request_chapters(response)
 
     def parse_content(self, response: scrapy.http.Response):
         """Extract the content of chapter.
@@ -113,62 +88,50 @@ class DemoSpider(scrapy.Spider):
 
         Yields
         ------
-        Request
-            Request to the next chapter.
+        Chapter
+            The chapter, saved by the pipeline.
         """
-        get_content(response, self.save_path)
-        if (response.meta["id"] == len(self.toc)) or response.meta[
-            "id"
-        ] == self.stop_chap:
-            raise scrapy.exceptions.CloseSpider(reason="Done")
-        response.request.headers[b"Referer"] = [str.encode(response.url)]
-        yield scrapy.Request(
-            url=self.toc[response.meta["id"]],
-            headers=response.request.headers,
-            meta={"id": response.meta["id"] + 1},
-            callback=self.parse_content,
-        )
+        yield get_content(response)
 
 
-def get_info(response: scrapy.http.Response, save_path: Path):
+def get_info(response: scrapy.http.Response) -> NovelInfo:
     """Get info of this novel.
 
     Parameters
     ----------
     response : Response
         The response to parse.
-    save_path : Path
-        Path of raw directory.
+
+    Returns
+    -------
+    NovelInfo
+        Info of the novel.
     """
-    # get title
-    title = response.xpath("//*[@id='title']/text()").get()
-    author = response.xpath("//*[@id='author']/text()").get()
-    types = response.xpath("//*[@id='types']/p/text()").getall()
-    foreword = response.xpath("//*[@id='foreword']/p/text()").getall()
-    info = []
-    info.append(title)
-    info.append(author)
-    info.append(response.request.url)
-    info.append(types)
-    info.extend(foreword)
-    (save_path / "foreword.txt").write_text("\n".join(info), encoding="utf-8")
-
-
-def get_content(response: scrapy.http.Response, save_path: Path):
+    return NovelInfo(
+        title=response.xpath("//*[@id='title']/text()").get(),
+        author=response.xpath("//*[@id='author']/text()").get(),
+        url=response.request.url,
+        types=", ".join(response.xpath("//*[@id='types']/p/text()").getall()),
+        foreword=response.xpath("//*[@id='foreword']/p/text()").getall(),
+    )
+
+
+def get_content(response: scrapy.http.Response) -> Chapter:
     """Get content of this novel.
 
     Parameters
     ----------
     response : Response
         The response to parse.
-    save_path : Path
-        Path of raw directory.
+
+    Returns
+    -------
+    Chapter
+        The chapter.
     """
-    # get chapter
-    chapter = response.xpath("//*[@id='chapter-title']/text()").get()
-    # get content
-    content = response.xpath("///*[@id='chapter']/p/text()").getall()
-    content.insert(0, chapter)
-    (save_path / f'{str(response.meta["id"])}.txt').write_text(
-        "\n".join([x.strip() for x in content if x.strip() != ""]), encoding="utf-8"
+    return Chapter(
+        id=response.meta["id"],
+        url=response.request.url,
+        chapter_title=response.xpath("//*[@id='chapter-title']/text()").get(),
+        chapter_content=response.xpath("///*[@id='chapter']/p/text()").getall(),
     )
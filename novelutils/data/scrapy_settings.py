@@ -1,9 +1,16 @@
 """Store the settings of spider for utils crawler. """
 
 
-def get_settings():
+def get_settings(concurrency: int = 8):
     """Return the settings of spider.
 
+    Parameters
+    ----------
+    concurrency : int, optional
+        Maximum number of chapters downloaded at the same time from
+        one domain, by default 8. The adaptive controller of
+        AppDownloaderMiddleware stays under this bound.
+
     Returns
     -------
     dict
@@ -11,11 +18,77 @@ def get_settings():
     """
     return {
         "AUTOTHROTTLE_ENABLED": True,
+        "AUTOTHROTTLE_TARGET_CONCURRENCY": float(concurrency),
+        "CONCURRENT_REQUESTS_PER_DOMAIN": concurrency,
+        "DOWNLOADER_MIDDLEWARES": {
+            # process_response runs before the one of RetryMiddleware (550), to
+            # see 429 and 503 before they are retried
+            "novelutils.app.middlewares.AppDownloaderMiddleware": 560,
+        },
+        "ADAPTIVE_CONCURRENCY_ENABLED": True,
+        "ADAPTIVE_CONCURRENCY_MAX": concurrency,
         "DEFAULT_REQUEST_HEADERS": {
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
                           "(KHTML, like Gecko) Chrome/84.0.4147.105 Safari/537.36",
         },
+        "ITEM_PIPELINES": {"novelutils.app.pipelines.AppPipeline": 300},
+        "WRITER_THREADS": 4,
+        "WRITER_BATCH_SIZE": 16,
+        "WRITER_MAX_PENDING": 8,
+        "CHAPTER_RETRY_ROUNDS": 3,
+        "CHAPTER_RETRY_BACKOFF": 10.0,
+        # skip chapters with the link or the content of another chapter
+        "CHAPTER_DEDUP": True,
+        # share of paragraphs of near duplicates, None to only skip the same text
+        "CHAPTER_DEDUP_SIMILARITY": None,
         "LOG_FORMAT": "%(asctime)s [%(name)s] %(levelname)s: %(message)s",
         "LOG_SHORT_NAMES": True,
     }
+
+
+def get_cache_settings(cache_dir: str):
+    """Return the settings of the HTTP cache of a novel.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Path of the cache directory of the novel.
+
+    Returns
+    -------
+    dict
+        HTTP cache settings.
+    """
+    return {
+        "HTTPCACHE_ENABLED": True,
+        "HTTPCACHE_DIR": cache_dir,
+        "HTTPCACHE_GZIP": True,
+        "HTTPCACHE_POLICY": "novelutils.app.httpcache.NovelCachePolicy",
+        "HTTPCACHE_IMMUTABLE_CHAPTERS": True,
+    }
+
+
+def get_metrics_settings(metrics_dir: str, name: str, interval: float = 10.0):
+    """Return the settings of the metrics extension of a novel.
+
+    Parameters
+    ----------
+    metrics_dir : str
+        Path of the directory of the metrics files.
+    name : str
+        Name of the metrics files of the novel.
+    interval : float, optional
+        Seconds between two writes of the metrics, by default 10.0.
+
+    Returns
+    -------
+    dict
+        Metrics extension settings.
+    """
+    return {
+        "EXTENSIONS": {"novelutils.app.metrics.CrawlMetrics": 500},
+        "METRICS_DIR": metrics_dir,
+        "METRICS_NAME": name,
+        "METRICS_INTERVAL": interval,
+    }
@@ -4,16 +4,20 @@ import re
 import logging
 from pathlib import Path
 from shutil import rmtree
+from typing import Callable, List, Set, Tuple
 
-import tldextract
 import validators
 import unicodedata
-from scrapy.crawler import CrawlerProcess
+from scrapy.crawler import Crawler, CrawlerProcess
 from scrapy.settings import Settings
-from scrapy.spiderloader import SpiderLoader
+from twisted.internet import defer, reactor
 
 from novelutils.data import scrapy_settings
 from novelutils.utils.file import FileConverter
+from novelutils.utils.manifest import Manifest
+from novelutils.utils.profiler import profiled
+from novelutils.utils.rawstore import open_raw, pack
+from novelutils.utils.registry import find_spider, get_domain
 from novelutils.utils.typehint import PathStr
 
 _logger = logging.getLogger(__name__)
@@ -35,7 +39,7 @@ class NovelCrawler:
             _logger.error("The input url not valid!")
             return
         self.u: str = url
-        self.spn = tldextract.extract(self.u).domain  # spider name
+        self.spn = get_domain(self.u)  # spider name
 
     def crawl(
         self,
@@ -44,9 +48,19 @@ class NovelCrawler:
         stop_chap: int,
         clean: bool = True,
         output: PathStr = None,
+        concurrency: int = 8,
+        resume: bool = False,
+        cache: bool = False,
+        retry_failed: bool = False,
+        packed: bool = False,
+        metrics_dir: PathStr = None,
+        on_chapter: Callable[[int, bytes], None] = None,
     ) -> PathStr:
         """Download novel and store it in the raw directory.
 
+        The Twisted reactor can only run once per process, use crawl_batch to
+        download many novels.
+
         Parameters
         ----------
         rm_raw : bool
@@ -59,6 +73,30 @@ class NovelCrawler:
             If specified, clean result files, by default True.
         output : PathStr, optional
             Path of the result directory, by default None.
+        concurrency : int, optional
+            Maximum number of chapters downloaded at the same time,
+            by default 8.
+        resume : bool, optional
+            If specified, keep the raw directory and only download chapters
+            missing or truncated according to its manifest, by default False.
+        cache : bool, optional
+            If specified, keep responses in the httpcache directory next to
+            the raw directory and reuse them in later crawls, by default False.
+        retry_failed : bool, optional
+            If specified, keep the raw directory and only download chapters
+            recorded in its ledger of failed chapters, by default False.
+        packed : bool, optional
+            If specified, store raw files in a single packed store instead of
+            one file per chapter, by default False.
+        metrics_dir : PathStr, optional
+            If specified, write the metrics of the crawl to ``<name>.json``
+            and ``<name>.prom`` in this directory while crawling,
+            by default None.
+        on_chapter : Callable[[int, bytes], None], optional
+            Called in the reactor thread with the id and content of each
+            chapter as soon as it is saved, so chapters can be processed
+            while the crawl goes on, by default None.
+
         Raises
         ------
         CrawlNovelError
@@ -71,51 +109,89 @@ class NovelCrawler:
         PathStr
             Path the raw directory.
         """
-        if start_chap < 1:
-            raise CrawlNovelError(
-                "Index of start chapter need to be greater than zero."
-            )
-        if stop_chap < start_chap and stop_chap != -1:
-            raise CrawlNovelError(
-                "Index of stop chapter need to be "
-                "greater than start chapter or equal -1."
-            )
+        check_range(start_chap, stop_chap, concurrency)
         if output is None:
-            tmp: list = self.u.split("/")
-            tmp_1: str = tmp[-1]
-            if tmp_1 == "":
-                for item in reversed(tmp):
-                    if item != "":
-                        tmp_1 = item
-                        break
-            rp = Path.cwd() / tmp_1 / "raw"
+            rp = Path.cwd() / self.get_name() / "raw"
         else:
             rp = Path(output)
-        if rm_raw is True:
-            _logger.info("Remove existing files in: %s", rp.resolve())
-            if rp.exists():
-                rmtree(rp)
-        rp.mkdir(exist_ok=True, parents=True)
-        spider_class = self._get_spider()
-        process = CrawlerProcess(settings=scrapy_settings.get_settings())
-        process.crawl(
-            spider_class,
-            url=self.u,
-            save_path=rp,
+        prepare_raw(rp, rm_raw, resume or retry_failed, packed)
+        run_spiders(
+            [(self.get_spider(), self, rp)],
             start_chap=start_chap,
             stop_chap=stop_chap,
+            concurrency=concurrency,
+            resume=resume,
+            cache=cache,
+            retry_failed=retry_failed,
+            metrics_dir=metrics_dir,
+            on_chapter=on_chapter,
         )
-        process.start()
         _logger.info("Done crawling. View result at: %s", str(rp.resolve()))
         if clean is True:
-            _logger.info("Start cleaning.")
-            c = FileConverter(rp, rp)
-            c.clean(duplicate_chapter=False, rm_result=False)
+            clean_raw(rp)
         return rp
 
-    def _get_spider(self):
+    def get_name(self) -> str:
+        """Return name of the novel directory, taken from the last part of url."""
+        tmp: list = self.u.split("/")
+        tmp_1: str = tmp[-1]
+        if tmp_1 == "":
+            for item in reversed(tmp):
+                if item != "":
+                    tmp_1 = item
+                    break
+        return tmp_1
+
+    def update(
+        self, output: PathStr, concurrency: int = 8, cache: bool = False
+    ) -> Set[int]:
+        """Download chapters published since the last crawl.
+
+        Only the info page, the toc and chapters missing from the raw
+        directory are downloaded.
+
+        Parameters
+        ----------
+        output : PathStr
+            Path of the raw directory of the previous crawl.
+        concurrency : int, optional
+            Maximum number of chapters downloaded at the same time,
+            by default 8.
+        cache : bool, optional
+            If specified, revalidate the info and toc pages with the HTTP
+            cache, by default False.
+
+        Returns
+        -------
+        Set[int]
+            Id of the new chapters.
+        """
+        m = Manifest(output)
+        m.scan()
+        old_ids = m.valid_ids()
+        m.close()
+        self.crawl(
+            rm_raw=False,
+            start_chap=1,
+            stop_chap=-1,
+            clean=False,
+            output=output,
+            concurrency=concurrency,
+            resume=True,
+            cache=cache,
+        )
+        m = Manifest(output)
+        new_ids = m.valid_ids() - old_ids
+        m.close()
+        _logger.info("Found %s new chapters.", len(new_ids))
+        return new_ids
+
+    def get_spider(self):
         """Get spider class based on the url domain.
 
+        The spider is looked up in the cached registry, so only its module is
+        imported.
+
         Returns
         -------
         object
@@ -126,12 +202,10 @@ class NovelCrawler:
         CrawlNovelError
             Spider not found.
         """
-        loader = SpiderLoader.from_settings(
-            Settings({"SPIDER_MODULES": ["novelutils.app.spiders"]})
-        )
-        if self.spn not in loader.list():
+        spider_class = find_spider(self.spn)
+        if spider_class is None:
             raise CrawlNovelError(f"Spider {self.spn} not found!")
-        return loader.load(self.spn)
+        return spider_class
 
     def get_langcode(self) -> str:
         """Return language code of novel."""
@@ -145,6 +219,331 @@ class CrawlNovelError(Exception):
     """Handle NovelCrawler Exception."""
 
 
+def crawl_batch(
+    urls: List[str],
+    rm_raw: bool,
+    start_chap: int,
+    stop_chap: int,
+    clean: bool = True,
+    output: PathStr = None,
+    concurrency: int = 8,
+    resume: bool = False,
+    cache: bool = False,
+    max_novels: int = 4,
+    domain_novels: int = 1,
+    retry_failed: bool = False,
+    packed: bool = False,
+    metrics_dir: PathStr = None,
+) -> List[Path]:
+    """Download many novels in one process.
+
+    Every novel is stored in its own directory ``output/<name>/raw``. Invalid
+    urls and urls without spider are skipped.
+
+    Parameters
+    ----------
+    urls : List[str]
+        Links of the novel information pages.
+    rm_raw : bool
+        If specified, remove all existing files in raw directories.
+    start_chap : int
+        Start crawling from this chapter.
+    stop_chap : int
+        Stop crawling at this chapter.
+    clean : bool, optional
+        If specified, clean result files, by default True.
+    output : PathStr, optional
+        Path of the directory holding all novels, by default working directory.
+    concurrency : int, optional
+        Maximum number of chapters downloaded at the same time for one novel,
+        by default 8.
+    resume : bool, optional
+        If specified, only download chapters missing or truncated,
+        by default False.
+    cache : bool, optional
+        If specified, use the HTTP cache of each novel, by default False.
+    max_novels : int, optional
+        Maximum number of novels downloaded at the same time, by default 4.
+    domain_novels : int, optional
+        Maximum number of novels downloaded at the same time from one domain,
+        by default 1.
+    retry_failed : bool, optional
+        If specified, only download chapters in the ledger of failed chapters,
+        by default False.
+    packed : bool, optional
+        If specified, store raw files of each novel in a packed store,
+        by default False.
+    metrics_dir : PathStr, optional
+        If specified, write the metrics of each novel to this directory while
+        crawling, by default None.
+
+    Returns
+    -------
+    List[Path]
+        Paths of the raw directories.
+    """
+    check_range(start_chap, stop_chap, concurrency)
+    if max_novels < 1 or domain_novels < 1:
+        raise CrawlNovelError("Number of novels need to be greater than zero.")
+    root = Path.cwd() if output is None else Path(output)
+    jobs = []
+    used = set()
+    for url in urls:
+        if not validators.url(url):
+            _logger.error("Skip invalid url: %s", url)
+            continue
+        p = NovelCrawler(url=url)
+        try:
+            spider_class = p.get_spider()
+        except CrawlNovelError as e:
+            _logger.error("Skip %s: %s", url, e)
+            continue
+        name = base = p.get_name()
+        if name in used:
+            name = f"{base}-{p.spn}"
+        # the same novel may be listed with several links of the same site
+        n = 2
+        while name in used:
+            name = f"{base}-{p.spn}-{n}"
+            n += 1
+        used.add(name)
+        rp = root / name / "raw"
+        prepare_raw(rp, rm_raw, resume or retry_failed, packed)
+        jobs.append((spider_class, p, rp))
+    run_spiders(
+        jobs,
+        start_chap=start_chap,
+        stop_chap=stop_chap,
+        concurrency=concurrency,
+        resume=resume,
+        cache=cache,
+        max_novels=max_novels,
+        domain_novels=domain_novels,
+        retry_failed=retry_failed,
+        metrics_dir=metrics_dir,
+    )
+    _logger.info("Done crawling %s novels. View result at: %s", len(jobs), root)
+    if clean is True:
+        for _, _, rp in jobs:
+            clean_raw(rp)
+    return [rp for _, _, rp in jobs]
+
+
+@profiled("crawl")
+def run_spiders(
+    jobs: List[Tuple[type, NovelCrawler, Path]],
+    start_chap: int,
+    stop_chap: int,
+    concurrency: int,
+    resume: bool,
+    cache: bool = False,
+    max_novels: int = 1,
+    domain_novels: int = 1,
+    retry_failed: bool = False,
+    metrics_dir: PathStr = None,
+    on_chapter: Callable[[int, bytes], None] = None,
+) -> None:
+    """Run spiders of all novels in a single reactor.
+
+    Parameters
+    ----------
+    jobs : List[Tuple[type, NovelCrawler, Path]]
+        Spider class, crawler and path of the raw directory of each novel.
+    start_chap : int
+        Start crawling from this chapter.
+    stop_chap : int
+        Stop crawling at this chapter.
+    concurrency : int
+        Maximum number of chapters downloaded at the same time for one novel.
+    resume : bool
+        If specified, only download chapters missing or truncated.
+    cache : bool, optional
+        If specified, use the HTTP cache of each novel, stored next to its
+        raw directory, by default False.
+    max_novels : int, optional
+        Maximum number of novels downloaded at the same time, by default 1.
+    domain_novels : int, optional
+        Maximum number of novels downloaded at the same time from one domain,
+        by default 1.
+    retry_failed : bool, optional
+        If specified, only download chapters in the ledger of failed chapters,
+        by default False.
+    metrics_dir : PathStr, optional
+        If specified, register the metrics extension of each novel, writing
+        files named after the directory of the novel, by default None.
+    on_chapter : Callable[[int, bytes], None], optional
+        Called with the id and content of each chapter saved by the spiders,
+        by default None.
+    """
+    if not jobs:
+        return
+    settings = Settings(scrapy_settings.get_settings(concurrency))
+    process = CrawlerProcess(settings=settings)
+    novel_sem = defer.DeferredSemaphore(max_novels)
+    domain_sems = {}
+    ds = []
+    crawlers = []
+    for spider_class, p, rp in jobs:
+        novel_settings = settings.copy()
+        if cache is True:
+            novel_settings.update(
+                scrapy_settings.get_cache_settings(str(rp.parent / "httpcache"))
+            )
+        if metrics_dir is not None:
+            novel_settings.update(
+                scrapy_settings.get_metrics_settings(str(metrics_dir), rp.parent.name)
+            )
+        crawler = Crawler(spider_class, novel_settings)
+        crawlers.append((crawler, p.u))
+        # wait for the domain first, so a novel does not hold a global slot
+        # while other novels of the same domain are running
+        if p.spn not in domain_sems:
+            domain_sems[p.spn] = defer.DeferredSemaphore(domain_novels)
+        d = domain_sems[p.spn].run(
+            novel_sem.run,
+            process.crawl,
+            crawler,
+            url=p.u,
+            save_path=rp,
+            start_chap=start_chap,
+            stop_chap=stop_chap,
+            resume=resume,
+            retry_failed=retry_failed,
+            on_chapter=on_chapter,
+        )
+        d.addErrback(_log_failure, p.u)
+        ds.append(d)
+    dl = defer.DeferredList(ds)
+    dl.addBoth(lambda _: reactor.callLater(0, reactor.stop))
+    process.start(stop_after_crawl=False)
+    if cache is True:
+        for crawler, url in crawlers:
+            report_cache(crawler.stats.get_stats(), url)
+
+
+def report_cache(stats: dict, url: str) -> None:
+    """Log how many requests of a crawl were served by the HTTP cache.
+
+    Parameters
+    ----------
+    stats : dict
+        Stats of the crawler.
+    url : str
+        The link of the novel information page.
+    """
+    hit = stats.get("httpcache/hit", 0)
+    revalidate = stats.get("httpcache/revalidate", 0)
+    miss = stats.get("httpcache/miss", 0) + stats.get("httpcache/invalidate", 0)
+    total = hit + revalidate + miss
+    _logger.info(
+        "HTTP cache of %s: %s hits, %s revalidated, %s misses, hit ratio %.1f%%",
+        url,
+        hit,
+        revalidate,
+        miss,
+        100 * (hit + revalidate) / total if total else 0.0,
+    )
+
+
+def _log_failure(failure, url: str) -> None:
+    """Log the error of a crawl without stopping the others."""
+    _logger.error("Failed to crawl %s: %s", url, failure.getErrorMessage())
+
+
+def prepare_raw(rp: Path, rm_raw: bool, resume: bool, packed: bool = False) -> None:
+    """Create the raw directory, remove its old files if needed.
+
+    Parameters
+    ----------
+    rp : Path
+        Path of the raw directory.
+    rm_raw : bool
+        If specified, remove all existing files in raw directory.
+    resume : bool
+        If specified, keep existing files even if rm_raw is specified.
+    packed : bool, optional
+        If specified, create the packed store of the raw directory and move
+        the kept files into it, by default False.
+    """
+    if rm_raw is True and resume is False:
+        _logger.info("Remove existing files in: %s", rp.resolve())
+        if rp.exists():
+            rmtree(rp)
+    rp.mkdir(exist_ok=True, parents=True)
+    if packed is True:
+        pack(rp)
+
+
+def clean_raw(rp: Path) -> None:
+    """Clean chapters of the raw directory in place.
+
+    Parameters
+    ----------
+    rp : Path
+        Path of the raw directory.
+    """
+    _logger.info("Start cleaning: %s", rp)
+    with FileConverter(rp, rp) as c:
+        c.clean(duplicate_chapter=False, rm_result=False)
+    # cleaning rewrites the chapters, keep the manifest in sync
+    m = Manifest(rp)
+    m.refresh()
+    m.close()
+
+
+def check_range(start_chap: int, stop_chap: int, concurrency: int) -> None:
+    """Validate the chapter range and the concurrency of a crawl.
+
+    Raises
+    ------
+    CrawlNovelError
+        Index of start chapter need to be greater than zero.
+    CrawlNovelError
+        Index of stop chapter need to be greater than start chapter or equal -1
+    CrawlNovelError
+        Concurrency need to be greater than zero.
+    """
+    if start_chap < 1:
+        raise CrawlNovelError(
+            "Index of start chapter need to be greater than zero."
+        )
+    if stop_chap < start_chap and stop_chap != -1:
+        raise CrawlNovelError(
+            "Index of stop chapter need to be "
+            "greater than start chapter or equal -1."
+        )
+    if concurrency < 1:
+        raise CrawlNovelError("Concurrency need to be greater than zero.")
+
+
+def get_url(raw_dir_path: PathStr) -> str:
+    """Return link of the novel info page stored in the raw directory.
+
+    Parameters
+    ----------
+    raw_dir_path : PathStr
+        Path of the raw directory.
+
+    Returns
+    -------
+    str
+        The link of the novel information page.
+
+    Raises
+    ------
+    CrawlNovelError
+        The foreword file is not found.
+    """
+    raw = open_raw(raw_dir_path)
+    try:
+        foreword = raw.read("foreword.txt")
+    except FileNotFoundError as e:
+        raise CrawlNovelError(f"Foreword file not found: {e}") from e
+    finally:
+        raw.close()
+    return foreword.decode("utf-8").splitlines()[2].strip()
+
+
 def slugify(value, allow_unicode=False):
     """Convert string to valid filename.
 
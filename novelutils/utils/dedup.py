@@ -0,0 +1,134 @@
+"""Define DuplicateIndex class."""
+import threading
+import zlib
+from collections import Counter
+from hashlib import sha1
+from typing import Dict, Optional
+
+
+class DuplicateIndex:
+    """Find chapters whose text was already seen under another chapter id.
+
+    Sites serve the same chapter under several toc entries or mirror links,
+    sometimes with a line of ads added or removed. Chapters are compared
+    without their title line:
+
+    - exact duplicates have the same hash of their text,
+    - near duplicates, only found with ``similarity``, share most of their
+      paragraphs. A sample of the paragraph hashes of each chapter is
+      indexed to find the chapters sharing one of its paragraphs, then the
+      hashes of all their paragraphs are compared.
+
+    Chapters shorter than ``min_size`` are never duplicates, placeholders of
+    chapters not published yet all look the same. Checks are thread safe.
+
+    The chapter with the lowest id is the original, whatever the order of the
+    checks. A chapter duplicated by a lower one checked after it is listed in
+    ``replaced``, its file is left to remove by the caller, and so are the
+    duplicates reported with it as original, see ``originals``.
+    """
+
+    def __init__(
+        self,
+        similarity: Optional[float] = None,
+        min_size: int = 200,
+        sample: int = 4,
+    ) -> None:
+        """Create an empty index.
+
+        Args:
+            similarity: share of the paragraphs of both chapters which must be
+                the same for a near duplicate, None to only find exact
+                duplicates
+            min_size: minimum size in bytes of the text of a chapter without
+                its title
+            sample: one paragraph out of sample is indexed, on average
+
+        Returns:
+            None
+        """
+        self.similarity = similarity
+        self.min_size = min_size
+        self.sample = sample
+        self.hashes: Dict[str, int] = {}  # hash of the text: chapter id
+        self.paragraphs: Dict[int, int] = {}  # sampled paragraph: chapter id
+        self.sets: Dict[int, frozenset] = {}  # chapter id: all its paragraphs
+        # chapter checked first but duplicated by a lower one: the lower one
+        self.replaced: Dict[int, int] = {}
+        self.originals: Dict[int, int] = {}  # duplicate: original returned
+        self.lock = threading.Lock()
+
+    def check(self, chap_id: int, content: bytes) -> Optional[int]:
+        """Return the chapter duplicated by this one, else add it to the index.
+
+        Args:
+            chap_id: id of the chapter
+            content: content of the raw chapter, title on the first line
+
+        Returns:
+            Optional[int]: id of the chapter with the same text, None if the
+                chapter is not a duplicate
+        """
+        body = content.partition(b"\n")[2]
+        if len(body) < self.min_size:
+            return None
+        digest = sha1(body).hexdigest()
+        lines = frozenset() if self.similarity is None else self._paragraphs(body)
+        with self.lock:
+            original = self.hashes.get(digest)
+            if original is None and lines:
+                original = self._similar(lines)
+            if original is not None and original != chap_id:
+                if original < chap_id:
+                    self.originals[chap_id] = original
+                    return original
+                self._replace(original, chap_id)
+            self.hashes.setdefault(digest, chap_id)
+            if lines:
+                for h in lines:
+                    if h % self.sample == 0:
+                        self.paragraphs.setdefault(h, chap_id)
+                self.sets[chap_id] = lines
+        return None
+
+    def add(self, chap_id: int, content: bytes) -> None:
+        """Add a chapter kept from a previous crawl to the index."""
+        self.check(chap_id, content)
+
+    def _replace(self, chap_id: int, lower: int) -> None:
+        """Make the lower chapter the original of the indexed chapter."""
+        for index in (self.hashes, self.paragraphs):
+            for key, value in index.items():
+                if value == chap_id:
+                    index[key] = lower
+        self.sets.pop(chap_id, None)
+        for key, value in self.replaced.items():
+            if value == chap_id:
+                self.replaced[key] = lower
+        self.replaced[chap_id] = lower
+
+    def _paragraphs(self, body: bytes) -> frozenset:
+        """Return the hashes of the paragraphs of the text."""
+        r = set()
+        for line in body.split(b"\n"):
+            line = line.strip()
+            # short lines such as "***" are shared by unrelated chapters
+            if len(line) >= 20:
+                # hash() of bytes changes with every process, crc32 does not
+                r.add(zlib.crc32(line))
+        return frozenset(r)
+
+    def _similar(self, lines: frozenset) -> Optional[int]:
+        """Return the indexed chapter sharing most of the paragraphs."""
+        if len(lines) < 3:
+            return None
+        shared = Counter(
+            self.paragraphs[h]
+            for h in lines
+            if h % self.sample == 0 and h in self.paragraphs
+        )
+        for original, _ in shared.most_common(3):
+            other = self.sets[original]
+            if len(lines & other) >= self.similarity * max(len(lines), len(other)):
+                return original
+        return None
@@ -2,18 +2,30 @@
 import logging
 
 from uuid import uuid1
+from io import BytesIO
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context
 from pathlib import Path
 from datetime import datetime
+from functools import partial
 from importlib_resources import files
 from shutil import move, rmtree, copy
-from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
-
-from PIL import Image
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from novelutils import data
-from novelutils.utils.crawler import NovelCrawler
-from novelutils.utils.file import FileConverter
-from novelutils.utils.typehint import PathStr, ListPath
+from novelutils.utils.file import (
+    INDEX_NAME,
+    FileConverter,
+    chapter_xhtml,
+    foreword_xhtml,
+    render_chapters,
+    run_chunks,
+)
+from novelutils.utils.profiler import profiled, stage
+from novelutils.utils.rawstore import RawSource, open_raw
+from novelutils.utils.template import Template, load_template
+from novelutils.utils.typehint import PathStr
+from novelutils.utils.zipwriter import PROFILES, ParallelZipWriter, compress_member
 
 _logger = logging.getLogger(__name__)
 
@@ -21,60 +33,119 @@ _logger = logging.getLogger(__name__)
 class EpubMaker:
     """Support making epub from input url or from a raw directory path."""
 
-    def __init__(self, output: PathStr = None):
+    def __init__(
+        self,
+        output: PathStr = None,
+        template_dir: PathStr = None,
+        compression: str = "max",
+        zip_workers: int = 4,
+        reuse_epub: bool = False,
+    ):
         """Assign path for the output directory.
 
         Parameters
         ----------
         output : PathStr, optional
             Path of the output directory, by default None.
+        template_dir : PathStr, optional
+            Directory of user templates, its files replace the files of the
+            default template with the same relative path, by default None.
+        compression : str, optional
+            Compression profile of the epub: fast, balanced or max,
+            by default max.
+        zip_workers : int, optional
+            Number of threads compressing the epub members, by default 4.
+        reuse_epub : bool, optional
+            Copy the members unchanged since the previous epub of the novel
+            without compressing them again, by default False. Update always
+            reuses the previous epub.
         """
         if output is None:
             self.rdp = Path.cwd()
         else:
             self.rdp = Path(output)
         self.tmp_edp = Path()
+        self.td = template_dir
+        self.compression = compression
+        self.zip_workers = zip_workers
+        self.reuse_epub = reuse_epub
 
     def from_url(
-        self, url: str, duplicate_chapter: bool, start: int, stop: int
+        self,
+        url: str,
+        duplicate_chapter: bool,
+        start: int,
+        stop: int,
+        cache: bool = False,
+        workers: int = 1,
+        stream: bool = False,
+        overlap: bool = False,
     ) -> None:
         """Get novel from web site, zip them to epub.
 
         Args:
           url: full web site to novel info page
-          duplicate_chapter: if specified, remove duplicate chapter title
+          duplicate_chapter: if specified, also remove the line after the title
+            when it loosely repeats the title
           start: start chapter index
           stop: stop chapter index, input -1 to get all chapters
+          cache: if specified, reuse responses of previous crawls
+          workers: number of processes converting chapters
+          stream: if specified, write chapters straight to the epub without
+            result and temporary epub directories
+          overlap: if specified, convert and compress chapters while the novel
+            is being crawled, then write the epub like stream
 
         Returns:
           None
         """
+        from novelutils.utils.crawler import NovelCrawler  # imports scrapy
+
         # get novel from web site.
         p = NovelCrawler(url=url)
-        rdp = p.crawl(rm_raw=True, start_chap=start, stop_chap=stop)
+        if overlap is True:
+            self._overlap_epub(p, duplicate_chapter, start, stop, cache, workers)
+            return
+        rdp = p.crawl(rm_raw=True, start_chap=start, stop_chap=stop, cache=cache)
+        if stream is True:
+            self._stream_epub(rdp, duplicate_chapter, p.get_langcode(), workers)
+            return
         # convert to xhtml
-        c = FileConverter(rdp)
-        c.convert_to_xhtml(
-            duplicate_chapter=duplicate_chapter,
-            rm_result=True,
-            lang_code=p.get_langcode(),
-        )
-        self.tmp_edp = rdp.parent / "epub"
-        self.tmp_edp.mkdir(exist_ok=True)
-        # copy epub template and then copy all files converted to epub directory
-        self._copy_to_epub(c.get_result_dir())
-        # make epub
-        self._make_epub(list(c.get_file_list("xhtml")), p.get_langcode())
+        with FileConverter(rdp, template_dir=self.td) as c:
+            c.convert_to_xhtml(
+                duplicate_chapter=duplicate_chapter,
+                rm_result=True,
+                lang_code=p.get_langcode(),
+                workers=workers,
+                incremental=True,
+            )
+            self.tmp_edp = rdp.parent / "epub"
+            self.tmp_edp.mkdir(exist_ok=True)
+            # copy epub template and then copy all files converted to epub directory
+            self._copy_to_epub(c.get_result_dir())
+            # make epub
+            self._make_epub(c, p.get_langcode())
 
     def from_raw(
-        self, raw_dir_path: PathStr, duplicate_chapter: bool, lang_code: str
+        self,
+        raw_dir_path: PathStr,
+        duplicate_chapter: bool,
+        lang_code: str,
+        workers: int = 1,
+        stream: bool = False,
     ) -> None:
         """Convert chapters from raw directory to xhtml and make epub.
 
+        Chapters unchanged since the last build keep their xhtml file.
+
         Args:
           raw_dir_path: path to raw directory
-          duplicate_chapter: if specified, remove duplicate chapter title
+          duplicate_chapter: if specified, also remove the line after the title
+            when it loosely repeats the title
           lang_code: language code of the novel
+          workers: number of processes converting chapters
+          stream: if specified, write chapters straight to the epub without
+            result and temporary epub directories
 
         Returns:
             None
@@ -86,19 +157,72 @@ class EpubMaker:
             raw_dir_path = Path(raw_dir_path)
         elif not isinstance(raw_dir_path, Path):
             raise EpubMakerError("raw_dir_path type must be str or Path.")
+        if stream is True:
+            self._stream_epub(raw_dir_path, duplicate_chapter, lang_code, workers)
+            return
         # convert raw files to xhtml
-        c = FileConverter(raw_dir_path)
-        c.convert_to_xhtml(
-            duplicate_chapter=duplicate_chapter, rm_result=True, lang_code=lang_code
-        )
-        # create temp epub directory
-        self.tmp_edp = raw_dir_path.parent / "epub"
-        self.tmp_edp.mkdir(exist_ok=True)
-        # copy epub template and then copy all files converted to epub directory
-        self._copy_to_epub(c.get_result_dir())
-        # make epub2
-        self._make_epub(list(c.get_file_list("xhtml")), lang_code)
+        with FileConverter(raw_dir_path, template_dir=self.td) as c:
+            c.convert_to_xhtml(
+                duplicate_chapter=duplicate_chapter,
+                rm_result=True,
+                lang_code=lang_code,
+                workers=workers,
+                incremental=True,
+            )
+            # create temp epub directory
+            self.tmp_edp = raw_dir_path.parent / "epub"
+            self.tmp_edp.mkdir(exist_ok=True)
+            # copy epub template and then copy all files converted to epub directory
+            self._copy_to_epub(c.get_result_dir())
+            # make epub2
+            self._make_epub(c, lang_code)
+
+    def update(
+        self,
+        raw_dir_path: PathStr,
+        duplicate_chapter: bool,
+        cache: bool = False,
+        workers: int = 1,
+    ) -> None:
+        """Get chapters published since the last crawl and make epub again.
+
+        Only the new chapters are downloaded, converted and compressed, the
+        others are reused from the raw directory, the result directory and the
+        previous epub.
+
+        Args:
+          raw_dir_path: path to raw directory of the previous crawl
+          duplicate_chapter: if specified, also remove the line after the title
+            when it loosely repeats the title
+          cache: if specified, revalidate the info and toc pages with the cache
+          workers: number of processes converting chapters
+
+        Returns:
+          None
+        """
+        from novelutils.utils.crawler import NovelCrawler, get_url  # imports scrapy
+
+        raw_dir_path = Path(raw_dir_path)
+        p = NovelCrawler(url=get_url(raw_dir_path))
+        new_ids = p.update(raw_dir_path, cache=cache)
+        with FileConverter(raw_dir_path, template_dir=self.td) as c:
+            if not new_ids and any(c.get_result_dir().iterdir()):
+                _logger.info("No new chapter, epub is up to date.")
+                return
+            c.convert_to_xhtml(
+                duplicate_chapter=duplicate_chapter,
+                rm_result=False,
+                lang_code=p.get_langcode(),
+                chapters=new_ids,
+                workers=workers,
+                incremental=True,
+            )
+            self.tmp_edp = raw_dir_path.parent / "epub"
+            self.tmp_edp.mkdir(exist_ok=True)
+            self._copy_to_epub(c.get_result_dir())
+            self._make_epub(c, p.get_langcode(), reuse=True)
 
+    @profiled("copy_to_epub")
     def _copy_to_epub(self, xhtml_dir: Path) -> None:
         # remove old files in temp epub directory
         if self.tmp_edp.exists():
@@ -106,11 +230,16 @@ class EpubMaker:
             self.tmp_edp.mkdir()
         # copy template epub to temp epub directory
         copytree_hm(files(data).joinpath("template"), self.tmp_edp)
+        if self.td is not None:
+            copytree_hm(Path(self.td), self.tmp_edp)
         self.tmp_edp.chmod(0o0400 | 0o0200)
         # remove template file c1.xhtml in temp epub directory
         (self.tmp_edp / "OEBPS" / "Text" / "c1.xhtml").unlink()
         # copy files from xhtml directory to temp epub directory
         copytree_hm(xhtml_dir, self.tmp_edp / "OEBPS" / "Text")
+        index_path = self.tmp_edp / "OEBPS" / "Text" / INDEX_NAME
+        if index_path.exists():
+            index_path.unlink()
         # move cover image from ./OEBPS/Text to ./OEBPS/Images
         (self.tmp_edp / "OEBPS" / "Images" / "cover.jpg").unlink()
         move(
@@ -118,11 +247,225 @@ class EpubMaker:
             self.tmp_edp / "OEBPS" / "Images",
         )
 
-    def _make_epub(self, xhtml_files: ListPath, lang_code: str):
+    @profiled("make_epub")
+    def _make_epub(self, c: FileConverter, lang_code: str, reuse: bool = False):
         tp = self.tmp_edp / "OEBPS" / "Text"
         # Shared variable
-        fw_lines = (tp / "foreword.xhtml").read_text(encoding="utf-8").splitlines()
-        novel_title = fw_lines[12][6:-5]  # content.opf, toc.ncx, zip
+        novel_title = c.novel["title"]  # content.opf, toc.ncx, zip
+        # edit cover image
+        cip = tp.parent / "Images" / "cover.jpg"  # cover image path
+        cover = _cover_info(str(cip))
+        cip.rename(cip.with_suffix(f".{cover[0]}"))  # rename cover image extension
+        # titles come from the index built while converting
+        chapters = [(entry["name"], entry["title"]) for entry in c.get_chapters()]
+        # edit cover.xhtml, nav.xhtml, toc.ncx and content.opf
+        package = self._package_files(
+            chapters, novel_title, c.novel["author"], lang_code, cover
+        )
+        for name, content in package.items():
+            (self.tmp_edp / name).write_text(content, encoding="utf-8")
+        # zip files to epub
+        with stage("zip"), self._open_zip(novel_title, reuse) as f_zip:
+            mime_path = self.tmp_edp/"mimetype"
+            f_zip.write(mime_path, "mimetype", store=True)
+            mime_path.unlink()
+            for path in sorted(self.tmp_edp.rglob("*")):
+                if path.is_file():
+                    f_zip.write(path, path.relative_to(self.tmp_edp).as_posix())
+        copy(files(data).joinpath("template/mimetype"), self.tmp_edp)
+        _logger.info("Done making epub. View result at: %s", str(self.rdp.resolve()))
+
+    @profiled("stream_epub")
+    def _stream_epub(
+        self,
+        raw_dir_path: Path,
+        duplicate_chapter: bool,
+        lang_code: str,
+        workers: int = 1,
+    ) -> None:
+        """Convert chapters from raw directory straight into the epub file.
+
+        Nothing is staged on disk: template files come from the package (or
+        the user template directory) and each chapter is written to the zip
+        as soon as it is converted. The raw files are read once and the epub
+        is written once.
+
+        Args:
+          raw_dir_path: path to raw directory
+          duplicate_chapter: if specified, also remove the line after the title
+            when it loosely repeats the title
+          lang_code: language code of the novel
+          workers: number of processes converting chapters
+
+        Returns:
+          None
+        """
+        ctp = load_template("OEBPS/Text/c1.xhtml", self.td)
+        raw = open_raw(raw_dir_path)
+        worker = partial(
+            render_chapters, duplicate_chapter=duplicate_chapter, template=ctp, raw=raw
+        )
+        chapters = run_chunks(worker, raw.chapter_ids(), workers)
+        self._write_stream(raw, lang_code, chapters)
+        raw.close()
+
+    @profiled("overlap_epub")
+    def _overlap_epub(
+        self,
+        p,
+        duplicate_chapter: bool,
+        start: int,
+        stop: int,
+        cache: bool = False,
+        workers: int = 1,
+    ) -> None:
+        """Crawl the novel while converting its chapters, then make the epub.
+
+        Each chapter is sent to a process pool as soon as the spider saves it,
+        where it is converted and compressed, so the network and the CPU work
+        at the same time. When the crawl ends only the foreword, the package
+        files and the compressed chapters are left to write. Compressed
+        chapters are kept in memory until then.
+
+        Args:
+          p: crawler of the novel
+          duplicate_chapter: if specified, also remove the line after the title
+            when it loosely repeats the title
+          start: start chapter index
+          stop: stop chapter index, input -1 to get all chapters
+          cache: if specified, reuse responses of previous crawls
+          workers: number of processes converting chapters
+
+        Returns:
+          None
+        """
+        worker = partial(
+            _convert_member,
+            duplicate_chapter=duplicate_chapter,
+            template=load_template("OEBPS/Text/c1.xhtml", self.td),
+            level=PROFILES[self.compression],
+        )
+        futures: Dict[int, Future] = {}
+        # spawn, the reactor and writer threads are running when workers start
+        with ProcessPoolExecutor(
+            max(1, workers), mp_context=get_context("spawn")
+        ) as executor:
+
+            def submit(chap_id: int, content: bytes) -> None:
+                futures[chap_id] = executor.submit(worker, chap_id, content)
+
+            rdp = p.crawl(
+                rm_raw=True,
+                start_chap=start,
+                stop_chap=stop,
+                clean=False,
+                cache=cache,
+                on_chapter=submit,
+            )
+            _logger.info(
+                "Crawl done, %s of %s chapters already converted.",
+                sum(f.done() for f in futures.values()),
+                len(futures),
+            )
+
+            def chapters() -> Iterator[Tuple[int, str, tuple]]:
+                for chap_id in sorted(futures):
+                    r = futures.pop(chap_id).result()
+                    if r is not None and chap_id in kept:
+                        yield r
+
+            raw = open_raw(rdp)
+            # chapters replaced by a lower duplicate are removed after the crawl
+            kept = set(raw.chapter_ids())
+            self._write_stream(raw, p.get_langcode(), chapters())
+            raw.close()
+
+    def _write_stream(
+        self, raw: RawSource, lang_code: str, chapters: Iterator[tuple]
+    ) -> None:
+        """Write the epub of the novel from the raw files and its chapters.
+
+        Args:
+          raw: raw files of the novel, for the foreword and the cover
+          lang_code: language code of the novel
+          chapters: id, title and content of each chapter in order, the
+            content is the XHTML or the member returned by compress_member
+
+        Returns:
+          None
+        """
+        fwtp = load_template("OEBPS/Text/foreword.xhtml", self.td)
+        fw_lines, foreword = foreword_xhtml(
+            raw.read("foreword.txt").decode("utf-8"), lang_code, fwtp
+        )
+        cover_image = raw.read("cover.jpg")
+        cover = _cover_info(BytesIO(cover_image))
+        names = []
+        with self._open_zip(fw_lines[0]) as f_zip:
+            # mimetype must be the first member, stored without compression
+            f_zip.writestr(
+                "mimetype",
+                files(data).joinpath("template/mimetype").read_bytes(),
+                store=True,
+            )
+            for name, content in _iter_template(self.td):
+                f_zip.writestr(name, content)
+            f_zip.writestr(f"OEBPS/Images/cover.{cover[0]}", cover_image)
+            f_zip.writestr("OEBPS/Text/foreword.xhtml", foreword)
+            for chap_id, title, content in chapters:
+                name = f"c{chap_id}.xhtml"
+                if isinstance(content, tuple):
+                    f_zip.writecompressed(content)
+                else:
+                    f_zip.writestr(f"OEBPS/Text/{name}", content)
+                names.append((name, title))
+            package = self._package_files(
+                names, fw_lines[0], fw_lines[1], lang_code, cover
+            )
+            for name, content in package.items():
+                f_zip.writestr(name, content)
+        _logger.info("Done making epub. View result at: %s", str(self.rdp.resolve()))
+
+    def _open_zip(self, novel_title: str, reuse: bool = False) -> ParallelZipWriter:
+        """Return the writer of the epub file of the novel.
+
+        Args:
+          novel_title: title of the novel, name of the epub file
+          reuse: if specified, copy unchanged members from the previous epub
+
+        Returns:
+          ParallelZipWriter: the writer, the epub replaces the previous one
+            when it is closed
+        """
+        ep = self.rdp / f"{novel_title}.epub"
+        return ParallelZipWriter(
+            ep,
+            self.compression,
+            self.zip_workers,
+            previous=ep if reuse or self.reuse_epub else None,
+        )
+
+    def _package_files(
+        self,
+        chapters: List[Tuple[str, str]],
+        novel_title: str,
+        author_name: str,
+        lang_code: str,
+        cover: Tuple[str, int, int],
+    ) -> Dict[str, str]:
+        """Render cover.xhtml, nav.xhtml, content.opf and toc.ncx.
+
+        Args:
+          chapters: file name and title of each chapter, in order
+          novel_title: escaped title of the novel
+          author_name: escaped name of the author
+          lang_code: language code of the novel
+          cover: extension, width and height of the cover image
+
+        Returns:
+          Dict[str, str]: content of each file by its path in the epub
+        """
+        ext, width, height = cover
         novel_uuid = uuid1()  # content.opf, toc.ncx
         publisher_name = "hacde"  # content.opf
         cover_title = "Ảnh bìa"  # cover.xhtml, toc.ncx
@@ -132,37 +475,18 @@ class EpubMaker:
             cover_title = "封面"
             nav_title = "目录"
             foreword_title = "前言"
-        # edit cover.xhtml
-        cp = tp / "cover.xhtml"  # cover path
-        cip = tp.parent / "Images" / "cover.jpg"  # cover image path
-        ci = Image.open(str(cip))  # cover image
-        ext = ci.format.lower()  # extension of cover image
-        width, height = ci.size  # get width and height
-        ci.close()
-        cip.rename(cip.with_suffix(f".{ext}"))  # rename cover image extension
-        cp.write_text(
-            cp.read_text(encoding="utf-8").format(
-                cover_title=cover_title, width=width, height=height, ext=ext
-            ),
-            encoding="utf-8",
-        )
-        # edit nav.xhtml, toc.ncx and content.opf
-        # define paths
-        np = tp / "nav.xhtml"  # nav.xhtml path
-        op = tp.parent / "content.opf"  # content.opf path
-        ncxp = tp.parent / "ncx" / "toc.ncx"  # toc.ncx path
         # create tag list
         nav_li_tag_list = list()
         opf_item_tag_list = list()
         opf_itemref_tag_list = list()
         navpoint_tag_list = list()
-        nav_li = '    <li><a href="{chapter_name}">{chapter_title}</a></li>'
-        item_tag = (
+        nav_li = Template('    <li><a href="{chapter_name}">{chapter_title}</a></li>')
+        item_tag = Template(
             '<item id="{chapter_name}" '
             'href="Text/{chapter_name}" media-type="application/xhtml+xml"/>'
         )
-        itemref = '<itemref idref="{chapter_name}"/>'
-        navpoint = (
+        itemref = Template('<itemref idref="{chapter_name}"/>')
+        navpoint = Template(
             '  <navPoint id="navPoint{index}">\n'
             "      <navLabel>\n"
             "        <text>{chapter_title}</text>\n"
@@ -170,39 +494,35 @@ class EpubMaker:
             '      <content src="../Text/{chapter_name}" />\n'
             "  </navPoint>"
         )
-        index = 2
-        for item in xhtml_files[2:]:
-            chapter_title = item.read_text(encoding="utf-8").splitlines()[5][9:-8]
-            chapter_name = item.name
+        for index, (chapter_name, chapter_title) in enumerate(chapters, start=2):
             navpoint_tag_list.append(
-                navpoint.format(
+                navpoint.render(
                     index=str(index),
                     chapter_title=chapter_title,
                     chapter_name=chapter_name,
                 )
             )
-            opf_item_tag_list.append(item_tag.format(chapter_name=chapter_name))
-            opf_itemref_tag_list.append(itemref.format(chapter_name=chapter_name))
+            opf_item_tag_list.append(item_tag.render(chapter_name=chapter_name))
+            opf_itemref_tag_list.append(itemref.render(chapter_name=chapter_name))
             nav_li_tag_list.append(
-                nav_li.format(chapter_name=chapter_name, chapter_title=chapter_title)
+                nav_li.render(chapter_name=chapter_name, chapter_title=chapter_title)
             )
-            index = index + 1
-        # write to nav.xhtml
-        np.write_text(
-            np.read_text(encoding="utf-8").format(
+        return {
+            "OEBPS/Text/cover.xhtml": load_template(
+                "OEBPS/Text/cover.xhtml", self.td
+            ).render(cover_title=cover_title, width=width, height=height, ext=ext),
+            "OEBPS/Text/nav.xhtml": load_template(
+                "OEBPS/Text/nav.xhtml", self.td
+            ).render(
                 language_code=lang_code,
                 nav_title=nav_title,
                 foreword_title=foreword_title,
                 cover_title=cover_title,
                 nav_li_tag_list="\n".join(nav_li_tag_list),
             ),
-            encoding="utf-8",
-        )
-        # write to content.opf
-        op.write_text(
-            op.read_text(encoding="utf-8").format(
+            "OEBPS/content.opf": load_template("OEBPS/content.opf", self.td).render(
                 novel_title=novel_title,
-                author_name=fw_lines[14][5:-4],
+                author_name=author_name,
                 language_code=lang_code,
                 publisher_name=publisher_name,
                 date_created=datetime.now().strftime("%Y-%m-%d"),
@@ -212,27 +532,13 @@ class EpubMaker:
                 opf_item_tag_list="\n    ".join(opf_item_tag_list),
                 opf_itemref_tag_list="\n    ".join(opf_itemref_tag_list),
             ),
-            encoding="utf-8",
-        )
-        # write to toc.ncx
-        ncxp.write_text(
-            ncxp.read_text(encoding="utf-8").format(
+            "OEBPS/ncx/toc.ncx": load_template("OEBPS/ncx/toc.ncx", self.td).render(
                 novel_uuid=novel_uuid,
                 novel_title=novel_title,
                 foreword_title=foreword_title,
                 navpoint_tag_list="\n".join(navpoint_tag_list),
             ),
-            encoding="utf-8",
-        )
-        # zip files to epub
-        with ZipFile(self.rdp / f"{novel_title}.epub", "w", compression=ZIP_DEFLATED, compresslevel=9) as f_zip:
-            mime_path = self.tmp_edp/"mimetype"
-            f_zip.write(mime_path, mime_path.relative_to(self.tmp_edp), compress_type=ZIP_STORED)
-            mime_path.unlink()
-            for path in self.tmp_edp.rglob("*"):
-                f_zip.write(path, path.relative_to(self.tmp_edp))
-        copy(files(data).joinpath("template/mimetype"), self.tmp_edp)
-        _logger.info("Done making epub. View result at: %s", str(self.rdp.resolve()))
+        }
 
 
 class EpubMakerError(Exception):
@@ -241,6 +547,96 @@ class EpubMakerError(Exception):
     pass
 
 
+def _convert_member(
+    chap_id: int,
+    content: bytes,
+    duplicate_chapter: bool,
+    template: Template,
+    level: int,
+) -> Optional[Tuple[int, str, tuple]]:
+    """Convert a raw chapter and compress it as an epub member, in a worker.
+
+    Args:
+      chap_id: id of the chapter
+      content: content of the raw chapter
+      duplicate_chapter: if specified, also remove the line after the title
+        when it loosely repeats the title
+      template: the chapter template
+      level: deflate level of the member
+
+    Returns:
+      Optional[Tuple[int, str, tuple]]: id, title and member of the chapter,
+        None if the chapter is empty
+    """
+    try:
+        title, xhtml = chapter_xhtml(
+            content.decode("utf-8"), duplicate_chapter, template
+        )
+    except IndexError:
+        _logger.warning("Empty chapter: %s", chap_id)
+        return None
+    member = compress_member(
+        f"OEBPS/Text/c{chap_id}.xhtml", xhtml.encode("utf-8"), level
+    )
+    return chap_id, title, member
+
+
+# files of the template which are rendered for each novel
+_RENDERED = {
+    "mimetype",
+    "OEBPS/Images/cover.jpg",
+    "OEBPS/Text/c1.xhtml",
+    "OEBPS/Text/cover.xhtml",
+    "OEBPS/Text/foreword.xhtml",
+    "OEBPS/Text/nav.xhtml",
+    "OEBPS/content.opf",
+    "OEBPS/ncx/toc.ncx",
+}
+
+
+def _iter_template(template_dir: PathStr = None) -> Iterator[Tuple[str, bytes]]:
+    """Yield path in the epub and content of the static template files.
+
+    Files of the user template directory replace the default ones.
+
+    Args:
+      template_dir: directory of user templates
+
+    Yields:
+      Tuple[str, bytes]: path in the epub and content of each file
+    """
+    found = {}
+
+    def walk(item, prefix: str):
+        for child in item.iterdir():
+            name = prefix + child.name
+            if child.is_dir():
+                walk(child, name + "/")
+            elif name not in _RENDERED:
+                found[name] = child
+
+    walk(files(data).joinpath("template"), "")
+    if template_dir is not None:
+        walk(Path(template_dir), "")
+    for name, item in sorted(found.items()):
+        yield name, item.read_bytes()
+
+
+def _cover_info(fp) -> Tuple[str, int, int]:
+    """Return extension, width and height of the cover image.
+
+    Args:
+      fp: path or file object of the cover image
+
+    Returns:
+      Tuple[str, int, int]: extension, width and height
+    """
+    from PIL import Image  # only needed to size the cover
+
+    with Image.open(fp) as ci:
+        return ci.format.lower(), ci.size[0], ci.size[1]
+
+
 def copytree_hm(src: Path, dst: Path):
     """Copy files in src directory to dst directory recursively.
 
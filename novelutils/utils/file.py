@@ -1,33 +1,59 @@
 """Define FileConverter class."""
+import json
 import logging
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
-from shutil import rmtree, copy
+from shutil import rmtree
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 import unicodedata as ud
-from importlib_resources import files
 
-from novelutils import data
+from novelutils.utils.manifest import describe
+from novelutils.utils import profiler
+from novelutils.utils.profiler import profiled
+from novelutils.utils.rawstore import RawDir, RawSource, open_raw
+from novelutils.utils.template import Template, TemplateError, load_template
 from novelutils.utils.typehint import PathStr, DictPath
 
 _logger = logging.getLogger(__name__)
 
+INDEX_NAME = "index.json"
+# version of the conversion rules, part of the key of converted chapters
+RULES = 3
+
 
 class FileConverter:
-    """This class define clean method and convert to xhtml method."""
+    """This class define clean method and convert to xhtml method.
+
+    Raw files are read from the packed store of the raw directory if it has
+    one, else from the files of the raw directory. Use the converter in a
+    with statement, or call close, to release the packed store.
+    """
 
-    def __init__(self, raw_dir_path: PathStr, result_dir_path: PathStr = None) -> None:
+    def __init__(
+        self,
+        raw_dir_path: PathStr,
+        result_dir_path: PathStr = None,
+        template_dir: PathStr = None,
+    ) -> None:
         """Init path of raw directory and result directory.
 
         Args:
             raw_dir_path: path of raw directory
             result_dir_path: path of result directory
+            template_dir: directory of user templates overriding the default
+                ones, such as "OEBPS/Text/c1.xhtml"
 
         Returns:
             None
         """
         self.x = Path(raw_dir_path)
+        self.td = template_dir
         if not self.x.exists():
             raise FileConverterError(f"Raw directory not found: {self.x}")
+        self.raw: RawSource = open_raw(self.x)
         if result_dir_path is None:
             self.y = self.x.parent / "result_dir"
         else:
@@ -39,142 +65,156 @@ class FileConverter:
             )
         self.txt: DictPath = {}  # use to track txt files in result directory
         self.xhtml: DictPath = {}  # use to track txt files in result directory
+        # id, title, file name, byte size and hash of converted chapters
+        self.index: Dict[int, dict] = {}
+        self.novel: dict = {}  # escaped title and author of the novel
+
+    def __enter__(self) -> "FileConverter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the raw files, the packed store keeps a connection open."""
+        self.raw.close()
 
-    def clean(self, duplicate_chapter: bool, rm_result: bool) -> int:
+    @profiled("clean")
+    def clean(
+        self, duplicate_chapter: bool, rm_result: bool, workers: int = 1
+    ) -> int:
         """Clean all raw files in raw directory.
 
         Args:
-            duplicate_chapter: if specified, remove duplicate chapter title
+            duplicate_chapter: if specified, also remove the line after the title
+                when it loosely repeats the title, see drop_title_repeat
             rm_result: if specified, remove all old files in result directory
+            workers: number of processes cleaning chapters, by default 1
 
         Returns:
             int: -1 if raw directory empty
         """
-        if not any(self.x.iterdir()):
+        if not self.raw.names():
             return -1
         if rm_result is True:
             _logger.info("Remove existing files in: %s", self.y.resolve())
             self._rm_result()
+        # cleaning in place rewrites the raw files, packed or not
+        dst = self.raw if self.x == self.y else RawDir(self.y)
         # copy cover image to result directory
-        cover_path = self.x / "cover.jpg"
-        tmp = self.y / cover_path.name
-        if tmp != cover_path:
-            copy(cover_path, tmp)
-        self.txt[-1] = tmp
+        if dst is not self.raw:
+            dst.write("cover.jpg", self.raw.read("cover.jpg"))
+        self.txt[-1] = self.y / "cover.jpg"
         # clean foreword.txt
-        fw_path = self.x / "foreword.txt"
         fw_lines = [
-            line.strip() for line in fw_path.read_text(encoding="utf-8").splitlines()
+            line.strip()
+            for line in self.raw.read("foreword.txt").decode("utf-8").splitlines()
         ]
         r = fw_lines[:4]
-        r.extend(fix_bad_indent(tuple(fw_lines[4:])))
-        tmp = self.y / fw_path.name
-        tmp.write_text("\n".join(r), encoding="utf-8")
-        self.txt[0] = tmp
+        r.extend(merge_lines(fw_lines[4:]))
+        dst.write("foreword.txt", "\n".join(r).encode("utf-8"))
+        self.txt[0] = self.y / "foreword.txt"
         # clean chapter.txt
-        r = fw_path.with_suffix(".temp")
-        fw_path.rename(r)
-        f_list = [item for item in self.x.glob("*.txt") if item.is_file()]
-        r.rename(fw_path)
-        for chapter in f_list:
-            c_lines = [
-                line.strip()
-                for line in chapter.read_text(encoding="utf-8").splitlines()
-            ]
-            if duplicate_chapter is True:
-                c_lines.pop(1)
-            tmp = self.y / chapter.name
-            tmp.write_text("\n".join(fix_bad_indent(tuple(c_lines))), encoding="utf-8")
-            self.txt[int(chapter.stem)] = tmp
+        worker = partial(
+            clean_chapters, duplicate_chapter=duplicate_chapter, src=self.raw, dst=dst
+        )
+        self.txt.update(run_chunks(worker, self.raw.chapter_ids(), workers))
         _logger.info("Done cleaning. View result at: %s", self.y.resolve())
 
+    @profiled("convert")
     def convert_to_xhtml(
-            self, duplicate_chapter: bool, rm_result: bool, lang_code: str
+            self,
+            duplicate_chapter: bool,
+            rm_result: bool,
+            lang_code: str,
+            chapters: Set[int] = None,
+            workers: int = 1,
+            incremental: bool = False,
     ) -> int:
         """Clean files and convert to XHTML.
 
+        The id, title, file name, byte size and hash of every chapter are kept
+        in ``self.index`` and saved to index.json in the result directory,
+        with the key of the conversion: hash of the raw file, version of the
+        chapter template and conversion options. In incremental mode, chapters
+        whose key did not change keep their result file.
+
         Args:
-            duplicate_chapter: if specified, remove duplicate chapter title
+            duplicate_chapter: if specified, also remove the line after the title
+                when it loosely repeats the title, see drop_title_repeat
             rm_result: if specified, remove all old files in result directory
             lang_code: language code of the novel
+            chapters: if specified, only convert these chapters and reuse the
+                result files of the others when they exist
+            workers: number of processes converting chapters, by default 1
+            incremental: if specified, keep the result directory even with
+                rm_result, only convert chapters whose key changed and remove
+                result files of chapters no longer in raw directory
 
         Returns:
             int: -1 if raw directory empty
         """
-        if not any(self.x.iterdir()):
+        if not self.raw.names():
             return -1
-        # Check if default template is exist, if not throw exception
-        # template of chapter
-        txtp = files(data).joinpath(r"template/OEBPS/Text")
-        ctp = txtp / "c1.xhtml"
-        if ctp.exists() is False or ctp.is_dir():
-            raise FileConverterError(f"Chapter template not found: {ctp}")
-        # template of foreword
-        fwtp = txtp / "foreword.xhtml"
-        if fwtp.exists() is False or fwtp.is_dir():
-            raise FileConverterError(f"Foreword template not found: {ctp}")
+        # Check if templates exist, if not throw exception
+        try:
+            ctp = load_template("OEBPS/Text/c1.xhtml", self.td)  # chapter
+            fwtp = load_template("OEBPS/Text/foreword.xhtml", self.td)  # foreword
+        except TemplateError as e:
+            raise FileConverterError(str(e)) from e
         # remove old files in result directory
-        if rm_result is True:
+        if rm_result is True and incremental is False:
             _logger.info("Remove existing files in: %s", self.y.resolve())
             self._rm_result()
         # copy cover image to result dir
-        cover_path = self.x / "cover.jpg"
-        tmp = self.y / cover_path.name
-        if tmp != cover_path:
-            copy(cover_path, tmp)
+        tmp = self.y / "cover.jpg"
+        if self.y != self.x or not tmp.exists():
+            tmp.write_bytes(self.raw.read("cover.jpg"))
         self.xhtml[-1] = tmp
         # clean foreword.txt
-        fwp = self.x / "foreword.txt"
-        fw_lines = [
-            escape_char(line.strip())
-            for line in fwp.read_text(encoding="utf-8").splitlines()
-        ]
-        foreword_p_tag_list = [
-            ("<p>" + line + "</p>") for line in fix_bad_indent(tuple(fw_lines[4:]))
-        ]
-        foreword_title = "Lời tựa"
-        if lang_code == "zh":
-            foreword_title = "内容简介"
-        tmp = self.y / f"{fwp.stem}.xhtml"
-        tmp.write_text(
-            fwtp.read_text(encoding="utf-8").format(
-                foreword_title=foreword_title,
-                novel_title=fw_lines[0],
-                author_name=fw_lines[1],
-                url=fw_lines[2],
-                types=fw_lines[3],
-                foreword_p_tag_list="\n\n  ".join(foreword_p_tag_list),
-            ),
-            encoding="utf-8",
+        fw_lines, content = foreword_xhtml(
+            self.raw.read("foreword.txt").decode("utf-8"), lang_code, fwtp
         )
+        tmp = self.y / "foreword.xhtml"
+        tmp.write_text(content, encoding="utf-8")
         self.xhtml[0] = tmp
+        self.novel = {"title": fw_lines[0], "author": fw_lines[1]}
+        old_index = {}
+        if chapters is not None or incremental is True:
+            old_index = self._load_index()
         # clean chapter.txt
-        r = fwp.with_suffix(".temp")
-        fwp.rename(r)
-        f_list = [item for item in self.x.glob("*.txt") if item.is_file()]
-        r.rename(fwp)
-        for chapter in f_list:
-            c_lines = [
-                escape_char(line.strip())
-                for line in chapter.read_text(encoding="utf-8").splitlines()
-            ]
-            if duplicate_chapter is True:
-                c_lines.pop(1)
-            tmp = self.y / f"c{chapter.stem}.xhtml"
-            try:
-                chapter_p_tag_list = [
-                    "<p>" + line + "</p>" for line in fix_bad_indent(tuple(c_lines[1:]))
-                ]
-                tmp.write_text(
-                    ctp.read_text(encoding="utf-8").format(
-                        chapter_title=c_lines[0],
-                        chapter_p_tag_list="\n\n  ".join(chapter_p_tag_list),
-                    ),
-                    encoding="utf-8",
-                )
-            except IndexError:
-                _logger.warning("Empty chapter: %s", tmp)
-            self.xhtml[int(chapter.stem)] = tmp
+        tasks = []
+        for chap_id in self.raw.chapter_ids():
+            tmp = self.y / f"c{chap_id}.xhtml"
+            if chapters is not None and chap_id not in chapters:
+                if tmp.exists():
+                    self.xhtml[chap_id] = tmp
+                    self.index[chap_id] = old_index.get(chap_id) or index_entry(
+                        chap_id, tmp
+                    )
+                    continue
+            tasks.append((chap_id, tmp, old_index.get(chap_id)))
+        worker = partial(
+            convert_chapters,
+            duplicate_chapter=duplicate_chapter,
+            template=ctp,
+            raw=self.raw,
+            options=f"{ctp.digest}/{duplicate_chapter}/{lang_code}/{RULES}",
+        )
+        converted = 0
+        for chap_id, tmp, entry in run_chunks(worker, tasks, workers):
+            self.xhtml[chap_id] = tmp
+            if entry is not None:
+                converted += entry != old_index.get(chap_id)
+                self.index[chap_id] = entry
+        if incremental is True:
+            _logger.info(
+                "Converted %s chapters, %s unchanged.",
+                converted,
+                len(self.index) - converted,
+            )
+            self._rm_stale()
+        self._save_index()
         _logger.info("Done converting. View result at: %s", self.y.resolve())
 
     def _rm_result(self) -> int:
@@ -189,6 +229,7 @@ class FileConverter:
         self.y.mkdir()
         self.txt = {}
         self.xhtml = {}
+        self.index = {}
 
     def _update_file_list(self, ext: str) -> None:
         """Remove all files not existing.
@@ -206,6 +247,47 @@ class FileConverter:
             if not t[key].exists():
                 del t[key]
 
+    def _rm_stale(self) -> None:
+        """Remove result files of chapters which are not in raw directory."""
+        if self.x == self.y:
+            return
+        for item in self.y.glob("c*.xhtml"):
+            if item.stem[1:].isdigit() and int(item.stem[1:]) not in self.xhtml:
+                item.unlink()
+
+    def get_chapters(self) -> List[dict]:
+        """Return the index entries of the converted chapters in order.
+
+        Returns:
+            List[dict]: id, title, file name, byte size and hash of chapters
+                whose file exists
+        """
+        return [
+            entry
+            for _, entry in sorted(self.index.items())
+            if (self.y / entry["name"]).exists()
+        ]
+
+    def _save_index(self) -> None:
+        """Write the novel info and the chapter index to index.json."""
+        tmp = self.y / f"{INDEX_NAME}.temp"
+        tmp.write_text(
+            json.dumps(
+                {"novel": self.novel, "chapters": self.get_chapters()},
+                ensure_ascii=False,
+            ),
+            encoding="utf-8",
+        )
+        tmp.replace(self.y / INDEX_NAME)
+
+    def _load_index(self) -> Dict[int, dict]:
+        """Return the chapter index saved in the result directory."""
+        try:
+            saved = json.loads((self.y / INDEX_NAME).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return {entry["id"]: entry for entry in saved["chapters"]}
+
     def get_result_dir(self) -> Path:
         """Return path of result directory.
 
@@ -239,6 +321,346 @@ class FileConverterError(Exception):
     pass
 
 
+def clean_chapters(
+    chunk: List[int], duplicate_chapter: bool, src: RawSource, dst: RawSource
+) -> List[Tuple[int, Path]]:
+    """Clean raw chapters and write them to the result directory.
+
+    Args:
+        chunk: id of the chapters
+        duplicate_chapter: if specified, also remove the line after the title
+            when it loosely repeats the title, see drop_title_repeat
+        src: raw files of the chapters
+        dst: result directory, or src to clean in place
+
+    Returns:
+        List[Tuple[int, Path]]: id and path of the result chapters
+    """
+    r = []
+    files = []
+    for chap_id in chunk:
+        c_lines = [
+            line.strip()
+            for line in src.read_chapter(chap_id).decode("utf-8").splitlines()
+        ]
+        # the repeat is found again at conversion, cleaning only removes it
+        # when asked, so that cleaning in place never removes a second line
+        if duplicate_chapter is True:
+            c_lines = drop_title_repeat(c_lines, loose=True)
+        files.append(
+            (f"{chap_id}.txt", "\n".join(merge_lines(c_lines)).encode("utf-8"))
+        )
+        r.append((chap_id, dst.x / f"{chap_id}.txt"))
+    dst.write_many(files)
+    return r
+
+
+def convert_chapters(
+    chunk: List[Tuple[int, Path, Optional[dict]]],
+    duplicate_chapter: bool,
+    template: Template,
+    raw: RawSource,
+    options: str = "",
+) -> List[Tuple[int, Path, Optional[dict]]]:
+    """Convert raw chapters to XHTML files in the result directory.
+
+    A chapter is skipped when its previous index entry has the same key and
+    its result file has the recorded size.
+
+    Args:
+        chunk: id of the chapter, path of result chapter and previous index
+            entry of the chapter if any
+        duplicate_chapter: if specified, also remove the line after the title
+            when it loosely repeats the title, see drop_title_repeat
+        template: the chapter template
+        raw: raw files of the chapters
+        options: template version and options of the conversion, part of
+            the key of each chapter
+
+    Returns:
+        List[Tuple[int, Path, Optional[dict]]]: id, path and index entry of
+            the result chapters, the entry is None for empty chapters
+    """
+    r = []
+    for chap_id, tmp, old in chunk:
+        text = raw.read_chapter(chap_id)
+        key = describe(text)["hash"] + "/" + options
+        if (
+            old is not None
+            and old.get("key") == key
+            and tmp.is_file()
+            and tmp.stat().st_size == old["size"]
+        ):
+            r.append((chap_id, tmp, old))
+            continue
+        entry = None
+        try:
+            title, content = chapter_xhtml(
+                text.decode("utf-8"), duplicate_chapter, template
+            )
+            data = content.encode("utf-8")
+            tmp.write_bytes(data)
+            entry = {"id": chap_id, "title": title, "name": tmp.name, "key": key}
+            entry.update(describe(data))
+        except IndexError:
+            _logger.warning("Empty chapter: %s", tmp)
+        r.append((chap_id, tmp, entry))
+    return r
+
+
+def index_entry(chap_id: int, xhtml_path: Path) -> dict:
+    """Return the index entry of a chapter converted without index.
+
+    Args:
+        chap_id: id of the chapter
+        xhtml_path: path of the XHTML file of the chapter
+
+    Returns:
+        dict: id, title, file name, byte size and hash of the chapter
+    """
+    content = xhtml_path.read_bytes()
+    title = re.search(rb"<title>(.*?)</title>", content, re.S)
+    entry = {
+        "id": chap_id,
+        "title": title.group(1).decode("utf-8") if title else "",
+        "name": xhtml_path.name,
+    }
+    entry.update(describe(content))
+    return entry
+
+
+def render_chapters(
+    chunk: List[int], duplicate_chapter: bool, template: Template, raw: RawSource
+) -> List[Tuple[int, str, str]]:
+    """Convert raw chapters to XHTML in memory, skip empty chapters.
+
+    Args:
+        chunk: id of the chapters
+        duplicate_chapter: if specified, also remove the line after the title
+            when it loosely repeats the title, see drop_title_repeat
+        template: the chapter template
+        raw: raw files of the chapters
+
+    Returns:
+        List[Tuple[int, str, str]]: id, title and XHTML of the chapters
+    """
+    r = []
+    for chap_id in chunk:
+        try:
+            title, content = chapter_xhtml(
+                raw.read_chapter(chap_id).decode("utf-8"), duplicate_chapter, template
+            )
+        except IndexError:
+            _logger.warning("Empty chapter: %s", chap_id)
+            continue
+        r.append((chap_id, title, content))
+    return r
+
+
+def chapter_xhtml(
+    text: str, duplicate_chapter: bool, template: Template
+) -> Tuple[str, str]:
+    """Convert the text of a raw chapter to XHTML.
+
+    Args:
+        text: content of the raw chapter, title on the first line
+        duplicate_chapter: if specified, also remove the line after the title
+            when it loosely repeats the title, see drop_title_repeat
+        template: the chapter template
+
+    Returns:
+        Tuple[str, str]: escaped title and XHTML of the chapter
+
+    Raises:
+        IndexError: the chapter is empty
+    """
+    c_lines = drop_title_repeat(
+        [line.strip() for line in text.splitlines()], loose=duplicate_chapter
+    )
+    paragraphs = merge_lines(c_lines[1:])
+    title = escape_char(c_lines[0])
+    content = template.render(
+        chapter_title=title, chapter_p_tag_list=p_tags(paragraphs)
+    )
+    return title, content
+
+
+def drop_title_repeat(lines: List[str], loose: bool = False) -> List[str]:
+    """Remove the line repeating the chapter title right after it.
+
+    Many sites print the title again at the top of the chapter. The first
+    non empty line after the title is a repeat when, ignoring case, spaces
+    and punctuation, one of them contains the other, the shorter has at least
+    half the characters of the longer and both have the same numbers, such as
+    "Chương 12: Gặp mặt" and "Chương 12 - gặp mặt" or "Chương 12". A line
+    which does not look like the title is never removed, so removing the
+    repeat again is harmless.
+
+    Args:
+        lines: stripped lines of the chapter, title on the first line
+        loose: if specified, the line is also a repeat when one of them
+            contains the other, or when both start with the same number and
+            the line is not longer than twice the title, such as "Chương 12"
+            and "12. Gặp mặt bạn cũ"
+
+    Returns:
+        List[str]: the lines without the repeat
+    """
+    for i in range(1, len(lines)):
+        if lines[i]:
+            if _same_title(lines[0], lines[i], loose):
+                return lines[:i] + lines[i + 1 :]
+            break
+    return lines
+
+
+def _same_title(title: str, line: str, loose: bool = False) -> bool:
+    """Check if the line is the title written another way."""
+    numbers = re.findall(r"\d+", title), re.findall(r"\d+", line)
+    a, b = _title_key(title), _title_key(line)
+    if len(a) > len(b):
+        a, b = b, a
+    if not a:
+        return False
+    if numbers[0] == numbers[1] and a in b and len(a) >= 0.5 * len(b):
+        return True
+    if not loose:
+        return False
+    if a in b:
+        return True
+    return (
+        bool(numbers[0] and numbers[1])
+        and int(numbers[0][0]) == int(numbers[1][0])
+        and len(line) <= 2 * len(title)
+    )
+
+
+def _title_key(text: str) -> str:
+    """Return the letters and digits of the text in lowercase."""
+    return "".join(c for c in ud.normalize("NFKC", text).casefold() if c.isalnum())
+
+
+def foreword_xhtml(text: str, lang_code: str, template: Template) -> Tuple[list, str]:
+    """Convert the text of foreword.txt to XHTML.
+
+    Args:
+        text: content of foreword.txt
+        lang_code: language code of the novel
+        template: the foreword template
+
+    Returns:
+        Tuple[list, str]: escaped lines of foreword.txt and XHTML of foreword
+    """
+    fw_lines = [line.strip() for line in text.splitlines()]
+    foreword_p_tag_list = p_tags(merge_lines(fw_lines[4:]))
+    fw_lines = [escape_char(line) for line in fw_lines[:4]]
+    foreword_title = "Lời tựa"
+    if lang_code == "zh":
+        foreword_title = "内容简介"
+    content = template.render(
+        foreword_title=foreword_title,
+        novel_title=fw_lines[0],
+        author_name=fw_lines[1],
+        url=fw_lines[2],
+        types=fw_lines[3],
+        foreword_p_tag_list=foreword_p_tag_list,
+    )
+    return fw_lines, content
+
+
+def run_chunks(worker: Callable, tasks: list, workers: int) -> Iterator:
+    """Run the worker on chunks of tasks, in a process pool if workers > 1.
+
+    Results are yielded as soon as their chunk is done, so callers can write
+    them without holding every result in memory.
+
+    Args:
+        worker: module level function taking a chunk and returning a list
+        tasks: items to process
+        workers: number of processes
+
+    Yields:
+        results of all chunks, in the order of tasks
+    """
+    if workers <= 1 or len(tasks) < 2:
+        for i in range(0, len(tasks), 64):
+            yield from worker(tasks[i : i + 64])
+        return
+    # a few chunks per process, so a slow chunk does not leave others idle
+    size = max(1, -(-len(tasks) // (workers * 4)))
+    chunks = [tasks[i : i + size] for i in range(0, len(tasks), size)]
+    measured = profiler.enabled()
+    if measured:
+        # the profiler of this process does not see the I/O of the workers
+        worker = partial(profiler.run_measured, worker)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for part in executor.map(worker, chunks):
+            if measured:
+                part, io = part
+                profiler.add_worker_io(io)
+            yield from part
+
+
+_MERGE_CHAR: Dict[str, bool] = {}  # first characters which continue a paragraph
+
+
+def merge_lines(lines: Iterable[str]) -> List[str]:
+    """Merge lines broken in the middle of a paragraph, in a single pass.
+
+    Same rules as fix_bad_indent: empty lines are dropped and a line is joined
+    to the previous one with a space when the previous one ends with "," or
+    ":" or when it starts with a lowercase letter.
+
+    Args:
+        lines: stripped lines without line break
+
+    Returns:
+        List[str]: the paragraphs
+
+    Raises:
+        IndexError: all lines are empty
+    """
+    paragraphs = []
+    buf = []
+    last = ""  # last character of the paragraph in buf
+    for line in lines:
+        if not line:
+            continue
+        if buf:
+            merge = last in ",:"
+            if not merge:
+                first = line[0]
+                merge = _MERGE_CHAR.get(first)
+                if merge is None:
+                    merge = _MERGE_CHAR[first] = ud.category(first)[1] == "l"
+            if merge:
+                buf.append(line)
+                last = line[-1]
+                continue
+            paragraphs.append(" ".join(buf))
+        buf = [line]
+        last = line[-1]
+    if not buf:
+        raise IndexError("No line to merge.")
+    paragraphs.append(" ".join(buf))
+    return paragraphs
+
+
+def p_tags(paragraphs: List[str]) -> str:
+    """Escape the paragraphs and wrap each of them in a <p> tag.
+
+    Args:
+        paragraphs: paragraphs without line break
+
+    Returns:
+        str: the <p> tags, separated by a blank line
+    """
+    # escaping the whole text with str.replace is about 20 times faster than
+    # str.translate, which is slow when characters map to several characters
+    text = escape_char("\n".join(paragraphs))
+    return "<p>" + text.replace("\n", "</p>\n\n  <p>") + "</p>"
+
+
 def fix_bad_indent(data_in: tuple) -> tuple:
     """Remove empty lines, bad indentation,...
 
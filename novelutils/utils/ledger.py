@@ -0,0 +1,113 @@
+"""Define Ledger class."""
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+from novelutils.utils.typehint import PathStr
+
+LEDGER_NAME = "failed.json"
+
+
+class Ledger:
+    """Track the chapters which could not be downloaded.
+
+    The ledger file maps the chapter id to its url, the reason of the last
+    failure, the number of attempts and the time of the last attempt. It is
+    rewritten on every change, failures are rare compared to chapters.
+    Changes are thread safe, saved chapters are removed from the writer
+    threads of the pipeline.
+    """
+
+    def __init__(self, raw_dir_path: PathStr) -> None:
+        """Load the ledger of the raw directory if it exists.
+
+        Args:
+            raw_dir_path: path of raw directory
+
+        Returns:
+            None
+        """
+        self.p = Path(raw_dir_path) / LEDGER_NAME
+        self.lock = threading.RLock()
+        self.entries: Dict[int, dict] = {}
+        if self.p.exists():
+            self.entries = {
+                int(key): value
+                for key, value in json.loads(self.p.read_text(encoding="utf-8")).items()
+            }
+
+    def fail(self, chap_id: int, url: str, reason: str) -> int:
+        """Record a failed attempt to download the chapter.
+
+        Args:
+            chap_id: id of the chapter
+            url: link of the chapter
+            reason: why the download failed
+
+        Returns:
+            int: number of attempts of the chapter so far
+        """
+        return self.fail_many([(chap_id, url, reason)])[0]
+
+    def fail_many(self, failures: Iterable[Tuple[int, str, str]]) -> List[int]:
+        """Record several failed attempts and save the ledger once, see fail.
+
+        Args:
+            failures: id, link and reason of the failed chapters
+
+        Returns:
+            List[int]: number of attempts of each chapter so far
+        """
+        r = []
+        with self.lock:
+            for chap_id, url, reason in failures:
+                entry = self.entries.setdefault(chap_id, {"url": url, "attempts": 0})
+                entry["reason"] = reason
+                entry["attempts"] += 1
+                entry["time"] = datetime.now().isoformat(timespec="seconds")
+                r.append(entry["attempts"])
+            if r:
+                self.save()
+        return r
+
+    def done(self, chap_id: int) -> None:
+        """Remove the chapter from the ledger after it was downloaded.
+
+        Args:
+            chap_id: id of the chapter
+
+        Returns:
+            None
+        """
+        self.done_many([chap_id])
+
+    def done_many(self, chap_ids: Iterable[int]) -> None:
+        """Remove the chapters from the ledger and save it once, see done."""
+        with self.lock:
+            removed = [self.entries.pop(chap_id, None) for chap_id in chap_ids]
+            if any(entry is not None for entry in removed):
+                self.save()
+
+    def ids(self) -> List[int]:
+        """Return id of the failed chapters in order."""
+        return sorted(self.entries)
+
+    def save(self) -> None:
+        """Write the ledger, remove the file when no chapter failed."""
+        with self.lock:
+            if not self.entries:
+                if self.p.exists():
+                    self.p.unlink()
+                return
+            tmp = self.p.with_suffix(".temp")
+            tmp.write_text(
+                json.dumps(
+                    {str(key): value for key, value in sorted(self.entries.items())},
+                    ensure_ascii=False,
+                    indent=2,
+                ),
+                encoding="utf-8",
+            )
+            tmp.replace(self.p)
@@ -0,0 +1,218 @@
+"""Define Manifest class."""
+import json
+import logging
+import threading
+from datetime import datetime
+from hashlib import sha1
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from novelutils.utils.rawstore import open_raw
+from novelutils.utils.typehint import PathStr
+
+_logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.jsonl"
+
+
+class Manifest:
+    """Track the chapters downloaded to the raw directory.
+
+    Each line of the manifest file is a JSON object with the chapter id, url,
+    byte size, content hash and fetch time. Chapters skipped as duplicates of
+    another chapter have no file, their entry has the id of that chapter in
+    "duplicate_of" and "duplicate_by", "link" or "content", instead of size
+    and hash. Lines are only appended while
+    crawling, so a crash loses at most the chapter being written. The lines
+    may be appended from the writer threads of the pipeline, while the
+    entries in memory are only changed by the spider.
+    """
+
+    def __init__(self, raw_dir_path: PathStr) -> None:
+        """Load the manifest of the raw directory if it exists.
+
+        Args:
+            raw_dir_path: path of raw directory
+
+        Returns:
+            None
+        """
+        self.x = Path(raw_dir_path)
+        self.p = self.x / MANIFEST_NAME
+        self.raw = open_raw(self.x)
+        self.entries: Dict[int, dict] = {}
+        self.lock = threading.Lock()  # writer threads append lines
+        if not self.p.exists():
+            return
+        for line in self.p.read_text(encoding="utf-8").splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # the last line may be cut off if the crawl crashed
+                _logger.warning("Skip broken manifest line: %s", line)
+                continue
+            self.entries[entry["id"]] = entry
+
+    def read_chapter(self, chap_id: int) -> Optional[bytes]:
+        """Return content of the chapter in raw directory, None if missing."""
+        try:
+            return self.raw.read_chapter(chap_id)
+        except FileNotFoundError:
+            return None
+
+    def record(self, chap_id: int, url: str, content: bytes = None) -> None:
+        """Add the saved chapter to the manifest.
+
+        Args:
+            chap_id: id of the chapter
+            url: link of the chapter
+            content: content of the chapter file, read from raw directory
+                if None
+
+        Returns:
+            None
+        """
+        if content is None:
+            content = self.raw.read_chapter(chap_id)
+        entry = chapter_entry(chap_id, url, content)
+        self.entries[chap_id] = entry
+        self.append([entry])
+
+    def record_duplicate(
+        self, chap_id: int, url: str, original: int, by: str = "content"
+    ) -> None:
+        """Add the chapter skipped as a duplicate to the manifest.
+
+        Args:
+            chap_id: id of the chapter
+            url: link of the chapter
+            original: id of the chapter with the same link or content
+            by: "link" or "content", how the duplicate was found
+
+        Returns:
+            None
+        """
+        entry = duplicate_entry(chap_id, url, original, by)
+        self.entries[chap_id] = entry
+        self.append([entry])
+
+    def append(self, entries: List[dict]) -> None:
+        """Append lines to the manifest file, thread safe.
+
+        The entries in memory are not changed, see record.
+
+        Args:
+            entries: entries made by chapter_entry or duplicate_entry
+
+        Returns:
+            None
+        """
+        lines = "".join(
+            json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries
+        )
+        with self.lock:
+            with self.p.open("a", encoding="utf-8") as f:
+                f.write(lines)
+
+    def close(self) -> None:
+        """Close the raw files, the packed store keeps a connection open."""
+        self.raw.close()
+
+    def scan(self) -> None:
+        """Add chapters in raw directory which are missing from the manifest.
+
+        Raw directories crawled before manifests existed have no entries, so
+        their chapters are recorded without url.
+
+        Returns:
+            None
+        """
+        for chap_id in self.raw.chapter_ids():
+            if chap_id not in self.entries:
+                self.record(chap_id, None)
+
+    def is_valid(self, chap_id: int) -> bool:
+        """Check if the chapter is in raw directory and not truncated.
+
+        Args:
+            chap_id: id of the chapter
+
+        Returns:
+            bool: True if size and hash of the file match the manifest, or if
+                the chapter has the link of another chapter. Duplicates found
+                by their content are checked again on the next crawl, they
+                may be placeholders which got their real text since.
+        """
+        entry = self.entries.get(chap_id)
+        if entry is None:
+            return False
+        if "duplicate_of" in entry:
+            return entry.get("duplicate_by") == "link"
+        content = self.read_chapter(chap_id)
+        if content is None or len(content) != entry["size"]:
+            return False
+        return describe(content)["hash"] == entry["hash"]
+
+    def valid_ids(self) -> Set[int]:
+        """Return id of all chapters which do not need to be downloaded again."""
+        return {chap_id for chap_id in self.entries if self.is_valid(chap_id)}
+
+    def refresh(self) -> None:
+        """Update size and hash of chapters after their files were rewritten.
+
+        Chapters whose file was removed are dropped from the manifest.
+
+        Returns:
+            None
+        """
+        for chap_id in list(self.entries):
+            if "duplicate_of" in self.entries[chap_id]:
+                continue
+            content = self.read_chapter(chap_id)
+            if content is None:
+                del self.entries[chap_id]
+                continue
+            self.entries[chap_id].update(describe(content))
+        tmp = self.p.with_suffix(".temp")
+        tmp.write_text(
+            "".join(
+                json.dumps(entry, ensure_ascii=False) + "\n"
+                for _, entry in sorted(self.entries.items())
+            ),
+            encoding="utf-8",
+        )
+        tmp.replace(self.p)
+
+
+def describe(content: bytes) -> dict:
+    """Return byte size and hash of the content."""
+    return {"size": len(content), "hash": sha1(content).hexdigest()}
+
+
+def chapter_entry(chap_id: int, url: str, content: bytes) -> dict:
+    """Return the manifest entry of the saved chapter, see Manifest.record."""
+    entry = {"id": chap_id, "url": url}
+    entry.update(describe(content))
+    entry["time"] = datetime.now().isoformat(timespec="seconds")
+    return entry
+
+
+def duplicate_entry(chap_id: int, url: str, original: int, by: str) -> dict:
+    """Return the manifest entry of the duplicate, see Manifest.record_duplicate.
+
+    Args:
+        chap_id: id of the chapter
+        url: link of the chapter
+        original: id of the chapter with the same link or content
+        by: "link" or "content", how the duplicate was found
+
+    Returns:
+        dict: the entry
+    """
+    return {
+        "id": chap_id,
+        "url": url,
+        "duplicate_of": original,
+        "duplicate_by": by,
+        "time": datetime.now().isoformat(timespec="seconds"),
+    }
@@ -0,0 +1,296 @@
+"""Define Profiler class and the stage hooks of the profiler."""
+import cProfile
+import functools
+import json
+import logging
+import os
+import pstats
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from novelutils.utils.typehint import PathStr
+
+_logger = logging.getLogger(__name__)
+
+_active: Optional["Profiler"] = None  # profiler of the running command
+_hooked = False  # audit hooks cannot be removed, install only one
+# counters measured in worker processes, see run_measured
+_WORKER_KEYS = ("read_bytes", "write_bytes", "files_read", "files_written")
+
+
+class Profiler:
+    """Measure every stage of a run: time, CPU, I/O bytes and opened files.
+
+    Stages are entered with ``stage`` (or the ``profiled`` decorator) while
+    the profiler is enabled, and nested stages are named after their parents,
+    such as "epub/zip". Numbers of a stage include its nested stages. CPU time
+    includes the worker processes which were waited for during the stage.
+    Bytes come from /proc/self/io and are not available on every system.
+    Bytes and files of the worker processes of run_chunks are measured in
+    the workers (see run_measured) and added to the stages waiting for them.
+
+    cProfile cannot nest, so the profiler of a stage is paused while a nested
+    stage runs: the cProfile stats of a stage exclude its nested stages.
+    """
+
+    def __init__(self, cprofile: PathStr = None, top: int = 20) -> None:
+        """Create the profiler.
+
+        Args:
+            cprofile: if specified, run cProfile in every stage and write the
+                stats of each stage to this directory
+            top: number of functions of each stage listed in the report when
+                cProfile is used
+
+        Returns:
+            None
+        """
+        self.cprofile = None if cprofile is None else Path(cprofile)
+        self.top = top
+        self.stack: List[str] = []
+        self.profs: List[cProfile.Profile] = []  # cProfile of the open stages
+        self.stages: Dict[str, dict] = {}
+        self.opened = {"read": 0, "write": 0}
+        self.workers = dict.fromkeys(_WORKER_KEYS, 0)  # I/O of worker processes
+        self.command: Optional[str] = None  # name of the CLI command, if any
+        self.start = datetime.now()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Measure the code run inside the with block as a stage.
+
+        Args:
+            name: name of the stage, prefixed by the names of the parent stages
+
+        Yields:
+            dict: the record of the stage, filled when the block exits
+        """
+        self.stack.append(name)
+        full_name = "/".join(self.stack)
+        record = self.stages.setdefault(full_name, _new_record())
+        before = self._snapshot()
+        prof = None
+        if self.cprofile is not None:
+            if self.profs:
+                self.profs[-1].disable()
+            prof = cProfile.Profile()
+            self.profs.append(prof)
+            prof.enable()
+        try:
+            yield record
+        finally:
+            if prof is not None:
+                prof.disable()
+                self.profs.pop()
+                if self.profs:
+                    self.profs[-1].enable()
+            after = self._snapshot()
+            self.stack.pop()
+            record["calls"] += 1
+            for key, value in after.items():
+                if value is not None and before[key] is not None:
+                    record[key] = (record[key] or 0) + value - before[key]
+            if prof is not None:
+                self._dump(full_name, record, prof)
+
+    def report(self) -> dict:
+        """Return the records of all stages, ready for JSON.
+
+        Returns:
+            dict: start time, pid, command and the record of every stage by
+                name
+        """
+        return {
+            "start": self.start.isoformat(timespec="seconds"),
+            "pid": os.getpid(),
+            "command": self.command,
+            "stages": self.stages,
+        }
+
+    def write(self, path: Optional[PathStr] = None) -> None:
+        """Write the report as JSON, to stderr if path is None."""
+        text = json.dumps(self.report(), indent=2)
+        if path is None:
+            print(text, file=sys.stderr)
+            return
+        Path(path).write_text(text, encoding="utf-8")
+        _logger.info("Profile report written to: %s", path)
+
+    def _snapshot(self) -> dict:
+        """Return the counters of the process."""
+        t = os.times()
+        io = _read_io()
+        w = self.workers
+        return {
+            "wall_s": time.perf_counter(),
+            "cpu_s": t.user + t.system + t.children_user + t.children_system,
+            "read_bytes": _add(io.get("rchar"), w["read_bytes"]),
+            "write_bytes": _add(io.get("wchar"), w["write_bytes"]),
+            "files_read": self.opened["read"] + w["files_read"],
+            "files_written": self.opened["write"] + w["files_written"],
+        }
+
+    def _dump(self, name: str, record: dict, prof: cProfile.Profile) -> None:
+        """Write the stats of the stage and add its top functions to the record."""
+        self.cprofile.mkdir(parents=True, exist_ok=True)
+        path = self.cprofile / f"{name.replace('/', '.')}.pstats"
+        prof.dump_stats(str(path))
+        stats = pstats.Stats(prof).sort_stats("cumulative")
+        record["stats"] = str(path)
+        record["top"] = [
+            {
+                "function": f"{file}:{line}({func})",
+                "calls": nc,
+                "tottime": tt,
+                "cumtime": ct,
+            }
+            for (file, line, func), (_, nc, tt, ct, _) in sorted(
+                stats.stats.items(), key=lambda item: item[1][3], reverse=True
+            )[: self.top]
+        ]
+
+
+def enable(cprofile: PathStr = None) -> Profiler:
+    """Start profiling the stages of this process.
+
+    Args:
+        cprofile: if specified, directory of the cProfile stats of each stage
+
+    Returns:
+        Profiler: the profiler receiving the stages
+    """
+    global _active, _hooked
+    _active = Profiler(cprofile)
+    if not _hooked and hasattr(sys, "addaudithook"):
+        sys.addaudithook(_count_open)
+        _hooked = True
+    return _active
+
+
+def disable() -> Optional[Profiler]:
+    """Stop profiling, return the profiler which was enabled."""
+    global _active
+    profiler, _active = _active, None
+    return profiler
+
+
+@contextmanager
+def stage(name: str):
+    """Measure the with block as a stage if profiling is enabled.
+
+    Args:
+        name: name of the stage
+
+    Yields:
+        Optional[dict]: the record of the stage, None when not profiling
+    """
+    if _active is None:
+        yield None
+        return
+    with _active.stage(name) as record:
+        yield record
+
+
+def profiled(name: str):
+    """Decorate a function to measure each call as a stage, see stage."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            with _active.stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def enabled() -> bool:
+    """Check if the stages of this process are being profiled."""
+    return _active is not None
+
+
+def run_measured(func, *args):
+    """Run the function in a worker process and measure its I/O.
+
+    Args:
+        func: function to run, such as the worker of run_chunks
+        args: arguments of the function
+
+    Returns:
+        Tuple[Any, dict]: result of the function, bytes and files read and
+            written while it ran, to give to add_worker_io in the parent
+    """
+    global _active
+    if _active is None:
+        # worker started by spawn, which does not inherit the profiler
+        enable()
+    before = _active._snapshot()
+    r = func(*args)
+    after = _active._snapshot()
+    return r, {
+        key: after[key] - before[key]
+        for key in _WORKER_KEYS
+        if after[key] is not None and before[key] is not None
+    }
+
+
+def add_worker_io(io: dict) -> None:
+    """Add the I/O measured by run_measured to the open stages."""
+    if _active is None:
+        return
+    for key, value in io.items():
+        _active.workers[key] += value
+
+
+def _add(value: Optional[int], extra: int) -> Optional[int]:
+    """Add the I/O of the workers to a counter which may be unavailable."""
+    return None if value is None else value + extra
+
+
+def _new_record() -> dict:
+    """Return the record of a stage which did not run yet."""
+    return {
+        "calls": 0,
+        "wall_s": 0.0,
+        "cpu_s": 0.0,
+        "read_bytes": None,
+        "write_bytes": None,
+        "files_read": 0,
+        "files_written": 0,
+    }
+
+
+def _read_io() -> dict:
+    """Return the I/O counters of the process, empty if not available."""
+    try:
+        with open("/proc/self/io", "rb") as f:
+            data = f.read()
+    except OSError:
+        return {}
+    r = {}
+    for line in data.splitlines():
+        key, _, value = line.partition(b":")
+        r[key.decode()] = int(value)
+    return r
+
+
+def _count_open(event: str, args: tuple) -> None:
+    """Count the files opened while profiling, an audit hook."""
+    if event != "open" or _active is None:
+        return
+    path, mode, flags = args
+    if path == "/proc/self/io":
+        return
+    if mode is None:
+        # os.open gives flags instead of a mode
+        writing = flags & (os.O_WRONLY | os.O_RDWR) != 0
+    else:
+        writing = any(c in mode for c in "wax+")
+    _active.opened["write" if writing else "read"] += 1
@@ -0,0 +1,310 @@
+"""Define the sources of raw files: raw directory and packed raw store."""
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, List, Tuple, Union
+
+from novelutils.utils.typehint import PathStr
+
+_logger = logging.getLogger(__name__)
+
+STORE_NAME = "raw.db"
+
+
+class RawDir:
+    """Raw files kept as one file per chapter in the raw directory.
+
+    The raw directory holds ``N.txt`` for chapter N, ``foreword.txt`` and
+    ``cover.jpg``. Chapters are listed by name, nothing is renamed, so
+    several readers may use the directory at the same time.
+    """
+
+    def __init__(self, raw_dir_path: PathStr) -> None:
+        """Use the files of the raw directory.
+
+        Args:
+            raw_dir_path: path of raw directory
+
+        Returns:
+            None
+        """
+        self.x = Path(raw_dir_path)
+
+    def chapter_ids(self) -> List[int]:
+        """Return id of all chapters in order."""
+        return sorted(
+            int(item.stem)
+            for item in self.x.glob("*.txt")
+            if item.stem.isdigit() and item.is_file()
+        )
+
+    def read(self, name: str) -> bytes:
+        """Return the content of the raw file.
+
+        Args:
+            name: name of the file, such as "foreword.txt" or "12.txt"
+
+        Returns:
+            bytes: content of the file
+
+        Raises:
+            FileNotFoundError: the file does not exist
+        """
+        return (self.x / name).read_bytes()
+
+    def read_chapter(self, chap_id: int) -> bytes:
+        """Return the content of the chapter, see read."""
+        return self.read(f"{chap_id}.txt")
+
+    def write_many(self, files: Iterable[Tuple[str, bytes]]) -> None:
+        """Write several raw files.
+
+        Args:
+            files: name and content of the files
+
+        Returns:
+            None
+        """
+        for name, content in files:
+            (self.x / name).write_bytes(content)
+
+    def write(self, name: str, content: bytes) -> None:
+        """Write the raw file, see write_many."""
+        self.write_many([(name, content)])
+
+    def delete_many(self, names: Iterable[str]) -> None:
+        """Remove several raw files, missing files are ignored.
+
+        Args:
+            names: name of the files
+
+        Returns:
+            None
+        """
+        for name in names:
+            p = self.x / name
+            if p.exists():
+                p.unlink()
+
+    def names(self) -> List[str]:
+        """Return name of all raw files."""
+        return [item.name for item in self.x.glob("*") if _is_raw(item.name)]
+
+    def close(self) -> None:
+        """Nothing to release, files are opened on each access."""
+
+
+class PackedStore:
+    """Raw files packed in a single SQLite database in the raw directory.
+
+    Every raw file of the directory layout is a row of the ``files`` table,
+    keyed by its name, so listing or reading thousands of chapters costs no
+    metadata operation on the file system. The database uses write-ahead
+    logging: readers do not block the spider writing chapters. The store may
+    be sent to worker processes, each of them opens its own connection.
+    """
+
+    def __init__(self, raw_dir_path: PathStr, create: bool = False) -> None:
+        """Open the store of the raw directory.
+
+        Args:
+            raw_dir_path: path of raw directory
+            create: if specified, create the store when it does not exist
+
+        Returns:
+            None
+
+        Raises:
+            RawStoreError: the store does not exist and create is False
+        """
+        self.x = Path(raw_dir_path)
+        self.p = self.x / STORE_NAME
+        if not create and not self.p.is_file():
+            raise RawStoreError(f"Raw store not found: {self.p}")
+        self.lock = threading.Lock()
+        self.conn = None
+        self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return the connection to the database, open it if needed."""
+        if self.conn is None:
+            # writer threads of the pipeline share the connection, see lock
+            self.conn = sqlite3.connect(str(self.p), check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA busy_timeout=30000")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS files "
+                "(name TEXT PRIMARY KEY, chap_id INTEGER, content BLOB NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS files_chap_id ON files (chap_id)"
+            )
+        return self.conn
+
+    def __getstate__(self):
+        """Pickle only the path, connections cannot cross processes."""
+        return {"x": self.x, "p": self.p}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def chapter_ids(self) -> List[int]:
+        """Return id of all chapters in order."""
+        with self.lock:
+            rows = self._connect().execute(
+                "SELECT chap_id FROM files WHERE chap_id IS NOT NULL ORDER BY chap_id"
+            )
+            return [row[0] for row in rows]
+
+    def read(self, name: str) -> bytes:
+        """Return the content of the raw file.
+
+        Args:
+            name: name of the file, such as "foreword.txt" or "12.txt"
+
+        Returns:
+            bytes: content of the file
+
+        Raises:
+            FileNotFoundError: the file is not in the store
+        """
+        with self.lock:
+            row = (
+                self._connect()
+                .execute("SELECT content FROM files WHERE name = ?", (name,))
+                .fetchone()
+            )
+        if row is None:
+            raise FileNotFoundError(f"{name} not found in {self.p}")
+        return row[0]
+
+    def read_chapter(self, chap_id: int) -> bytes:
+        """Return the content of the chapter, see read."""
+        return self.read(f"{chap_id}.txt")
+
+    def write_many(self, files: Iterable[Tuple[str, bytes]]) -> None:
+        """Write several raw files in one transaction.
+
+        Args:
+            files: name and content of the files
+
+        Returns:
+            None
+        """
+        rows = [(name, _chap_id(name), content) for name, content in files]
+        with self.lock:
+            with self._connect():
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO files (name, chap_id, content) "
+                    "VALUES (?, ?, ?)",
+                    rows,
+                )
+
+    def write(self, name: str, content: bytes) -> None:
+        """Write the raw file, see write_many."""
+        self.write_many([(name, content)])
+
+    def delete_many(self, names: Iterable[str]) -> None:
+        """Remove several raw files in one transaction, see write_many."""
+        rows = [(name,) for name in names]
+        with self.lock:
+            with self._connect():
+                self.conn.executemany("DELETE FROM files WHERE name = ?", rows)
+
+    def names(self) -> List[str]:
+        """Return name of all raw files."""
+        with self.lock:
+            return [
+                row[0] for row in self._connect().execute("SELECT name FROM files")
+            ]
+
+    def close(self) -> None:
+        """Close the connection of this process."""
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+RawSource = Union[RawDir, PackedStore]
+
+
+def open_raw(raw_dir_path: PathStr) -> RawSource:
+    """Return the source of the raw files of the directory.
+
+    Args:
+        raw_dir_path: path of raw directory
+
+    Returns:
+        RawSource: the packed store if the directory has one, else the files
+            of the directory
+    """
+    if (Path(raw_dir_path) / STORE_NAME).is_file():
+        return PackedStore(raw_dir_path)
+    return RawDir(raw_dir_path)
+
+
+def pack(raw_dir_path: PathStr) -> int:
+    """Move the raw files of the directory into its packed store.
+
+    Args:
+        raw_dir_path: path of raw directory
+
+    Returns:
+        int: number of files packed
+    """
+    src = RawDir(raw_dir_path)
+    dst = PackedStore(raw_dir_path, create=True)
+    names = src.names()
+    for i in range(0, len(names), 256):
+        dst.write_many((name, src.read(name)) for name in names[i : i + 256])
+    dst.close()
+    # remove the files only once the store holds all of them
+    for name in names:
+        (src.x / name).unlink()
+    _logger.info("Packed %s files into: %s", len(names), dst.p)
+    return len(names)
+
+
+def unpack(raw_dir_path: PathStr) -> int:
+    """Move the files of the packed store back to the directory layout.
+
+    Args:
+        raw_dir_path: path of raw directory
+
+    Returns:
+        int: number of files unpacked
+
+    Raises:
+        RawStoreError: the directory has no packed store
+    """
+    src = PackedStore(raw_dir_path)
+    dst = RawDir(raw_dir_path)
+    names = src.names()
+    for name in names:
+        dst.write(name, src.read(name))
+    src.close()
+    for suffix in ("", "-wal", "-shm"):
+        sp = src.p.with_name(src.p.name + suffix)
+        if sp.exists():
+            sp.unlink()
+    _logger.info("Unpacked %s files to: %s", len(names), dst.x)
+    return len(names)
+
+
+class RawStoreError(Exception):
+    """Raw store exception."""
+
+
+def _chap_id(name: str):
+    """Return id of the chapter file, None for other raw files."""
+    stem, _, suffix = name.partition(".")
+    return int(stem) if suffix == "txt" and stem.isdigit() else None
+
+
+def _is_raw(name: str) -> bool:
+    """Check if the file is a raw file, not a manifest or a ledger."""
+    return name in ("foreword.txt", "cover.jpg") or _chap_id(name) is not None
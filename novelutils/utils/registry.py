@@ -0,0 +1,157 @@
+"""Define the registry of spiders by domain."""
+
+import importlib
+import importlib.util
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+import tldextract
+
+from novelutils.utils.typehint import PathStr
+
+_logger = logging.getLogger(__name__)
+
+SPIDER_MODULES = ("novelutils.app.spiders",)
+REGISTRY_NAME = "spiders.json"
+
+# Use the suffix list bundled with tldextract, never fetch it over the network
+_extract = tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None)
+
+
+def get_domain(url: str) -> str:
+    """Return the domain of the url without subdomain and suffix.
+
+    Args:
+        url: link of a web page
+
+    Returns:
+        str: the domain, such as "example" for "https://www.example.com"
+    """
+    return _extract(url).domain
+
+
+def get_cache_dir() -> Path:
+    """Return the cache directory of novelutils, following XDG."""
+    root = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(root) / "novelutils"
+
+
+class SpiderRegistry:
+    """Map domains to spider classes without importing every spider.
+
+    The registry is built by importing the spider modules once, then kept as
+    JSON in the cache directory. It is rebuilt when a spider file is added,
+    removed or modified. A spider is found by its ``name``, the domains of its
+    ``allowed_domains`` and its ``aliases`` for mirror domains.
+    """
+
+    def __init__(self, cache_dir: PathStr = None) -> None:
+        """Load the registry from the cache, build it if it is outdated.
+
+        Args:
+            cache_dir: directory of the registry file, by default the
+                novelutils cache directory
+
+        Returns:
+            None
+        """
+        self.p = Path(cache_dir or get_cache_dir()) / REGISTRY_NAME
+        self.fp = _fingerprint()
+        self.spiders: Dict[str, dict] = self._load()
+        if self.spiders is None:
+            self.spiders = _build()
+            self._save()
+
+    def find(self, domain: str) -> Optional[type]:
+        """Return the spider class of the domain.
+
+        Args:
+            domain: domain of the novel url, see get_domain
+
+        Returns:
+            Optional[type]: the spider class, None if no spider supports it
+        """
+        entry = self.spiders.get(domain)
+        if entry is None:
+            return None
+        module = importlib.import_module(entry["module"])
+        return getattr(module, entry["class"])
+
+    def _load(self) -> Optional[Dict[str, dict]]:
+        """Return the cached registry if it matches the spider files."""
+        try:
+            cached = json.loads(self.p.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if cached.get("fingerprint") != self.fp:
+            return None
+        return cached["spiders"]
+
+    def _save(self) -> None:
+        """Write the registry to the cache, skip it if the cache is read only."""
+        try:
+            self.p.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.p.with_suffix(".temp")
+            tmp.write_text(
+                json.dumps({"fingerprint": self.fp, "spiders": self.spiders}),
+                encoding="utf-8",
+            )
+            tmp.replace(self.p)
+        except OSError as e:
+            _logger.debug("Cannot cache the spider registry: %s", e)
+
+
+_registry: Optional[SpiderRegistry] = None
+
+
+def find_spider(domain: str) -> Optional[type]:
+    """Return the spider class of the domain from the shared registry."""
+    global _registry
+    if _registry is None:
+        _registry = SpiderRegistry()
+    return _registry.find(domain)
+
+
+def _fingerprint() -> list:
+    """Return name, size and modification time of every spider file."""
+    files = []
+    for name in SPIDER_MODULES:
+        spec = importlib.util.find_spec(name)
+        for location in spec.submodule_search_locations:
+            for sp in sorted(Path(location).glob("*.py")):
+                stat = sp.stat()
+                files.append([str(sp), stat.st_size, stat.st_mtime_ns])
+    return files
+
+
+def _build() -> Dict[str, dict]:
+    """Import the spider modules and map every domain to its spider."""
+    from scrapy.utils.misc import walk_modules
+    from scrapy.utils.spider import iter_spider_classes
+
+    spiders = {}
+    for name in SPIDER_MODULES:
+        for module in walk_modules(name):
+            for spider_class in iter_spider_classes(module):
+                entry = {"module": module.__name__, "class": spider_class.__name__}
+                domains = [spider_class.name]
+                domains.extend(
+                    get_domain(x) for x in getattr(spider_class, "allowed_domains", [])
+                )
+                domains.extend(
+                    get_domain(x) for x in getattr(spider_class, "aliases", [])
+                )
+                for domain in domains:
+                    if domain in spiders and spiders[domain] != entry:
+                        _logger.warning(
+                            "Domain %s is claimed by %s and %s.",
+                            domain,
+                            spiders[domain]["class"],
+                            entry["class"],
+                        )
+                    spiders[domain] = entry
+    _logger.debug("Built spider registry with %s domains.", len(spiders))
+    return spiders
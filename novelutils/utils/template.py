@@ -0,0 +1,108 @@
+"""Define Template class and the loader of EPUB templates."""
+import logging
+from functools import lru_cache
+from hashlib import sha1
+from pathlib import Path
+from string import Formatter
+from typing import Optional
+
+from importlib_resources import files
+
+from novelutils import data
+from novelutils.utils.typehint import PathStr
+
+_logger = logging.getLogger(__name__)
+
+_formatter = Formatter()
+
+
+class Template:
+    """Template using the ``str.format`` syntax, parsed once.
+
+    The text is split into literal segments and replacement fields when the
+    template is created, so rendering only joins strings. Fields with a
+    conversion or a format spec are formatted like ``str.format`` does.
+    """
+
+    def __init__(self, text: str) -> None:
+        """Parse the template text.
+
+        Args:
+            text: content of the template
+
+        Returns:
+            None
+        """
+        self.text = text
+        self.digest = sha1(text.encode("utf-8")).hexdigest()
+        # (literal, field name, conversion, format spec) like Formatter.parse
+        self.parts = []
+        for literal, name, spec, conversion in _formatter.parse(text):
+            if self.parts and self.parts[-1][1] is None:
+                # merge the literals split by escaped braces
+                literal = self.parts.pop()[0] + literal
+            self.parts.append((literal, name, conversion, spec))
+
+    def render(self, **kwargs) -> str:
+        """Return the template filled with the values of the fields.
+
+        Args:
+            **kwargs: value of each field
+
+        Returns:
+            str: same result as ``text.format(**kwargs)``
+
+        Raises:
+            KeyError: a field has no value
+        """
+        r = []
+        for literal, name, conversion, spec in self.parts:
+            r.append(literal)
+            if name is None:
+                continue
+            value = kwargs[name]
+            if conversion is None and not spec:
+                r.append(value if isinstance(value, str) else format(value))
+                continue
+            value = _formatter.convert_field(value, conversion)
+            r.append(_formatter.format_field(value, spec))
+        return "".join(r)
+
+    def __reduce__(self):
+        """Pickle only the text, to send templates to worker processes."""
+        return Template, (self.text,)
+
+
+def load_template(name: str, template_dir: Optional[PathStr] = None) -> Template:
+    """Return the parsed template, from the user directory if it has one.
+
+    Args:
+        name: path of the template relative to the template directory, such
+            as "OEBPS/Text/c1.xhtml"
+        template_dir: directory of user templates overriding the default ones
+
+    Returns:
+        Template: the parsed template, cached for the whole process
+
+    Raises:
+        TemplateError: the template is not found
+    """
+    return _load(name, None if template_dir is None else str(template_dir))
+
+
+@lru_cache(maxsize=None)
+def _load(name: str, template_dir: Optional[str]) -> Template:
+    """Read and parse the template, once per name and directory."""
+    if template_dir is not None:
+        tp = Path(template_dir) / name
+        if tp.is_file():
+            _logger.debug("Use user template: %s", tp)
+            return Template(tp.read_text(encoding="utf-8"))
+    tp = files(data).joinpath("template").joinpath(name)
+    if not tp.is_file():
+        raise TemplateError(f"Template not found: {tp}")
+    return Template(tp.read_text(encoding="utf-8"))
+
+
+class TemplateError(Exception):
+    """Template exception."""
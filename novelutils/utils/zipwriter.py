@@ -0,0 +1,310 @@
+"""Define ParallelZipWriter class."""
+import logging
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Tuple
+from zipfile import BadZipFile, ZipFile, ZipInfo
+
+from novelutils.utils.typehint import PathStr
+
+_logger = logging.getLogger(__name__)
+
+# deflate level of each compression profile
+PROFILES = {"fast": 1, "balanced": 6, "max": 9}
+
+# media which are already compressed, deflating them only costs time
+STORED_SUFFIXES = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".mp3", ".mp4"}
+
+_STORED = 0
+_DEFLATED = 8
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+_CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+_END_RECORD = struct.Struct("<4s4H2LH")
+
+
+class ParallelZipWriter:
+    """Write a zip file whose members are deflated by worker threads.
+
+    Members are compressed with raw deflate in a thread pool (zlib releases
+    the GIL) and appended to the file in the order they were added, so the
+    archive is the same whatever the number of threads. Only the features
+    needed by EPUB are supported: no ZIP64, no encryption.
+
+    When a previous archive is given, a member whose size and CRC-32 match the
+    member of the same name in it is copied from it still compressed, so only
+    new and changed members are deflated. The archive is written to a
+    temporary file and replaces ``path`` when closed, so the previous archive
+    may be ``path`` itself.
+    """
+
+    def __init__(
+        self,
+        path: PathStr,
+        profile: str = "max",
+        workers: int = 4,
+        previous: PathStr = None,
+    ) -> None:
+        """Open the zip file for writing.
+
+        Args:
+            path: path of the zip file
+            profile: compression profile, one of fast, balanced, max
+            workers: number of compression threads
+            previous: path of an archive whose unchanged members are reused
+
+        Returns:
+            None
+
+        Raises:
+            ZipWriterError: the profile is unknown
+        """
+        if profile not in PROFILES:
+            raise ZipWriterError(
+                f"Unknown compression profile {profile}, use one of {list(PROFILES)}."
+            )
+        self.p = Path(path)
+        self.profile = profile
+        self.level = PROFILES[profile]
+        self.workers = max(1, workers)
+        self.old = {}  # members of the previous archive by name
+        self.old_f = None
+        if previous is not None and Path(previous).is_file():
+            try:
+                with ZipFile(previous) as z:
+                    self.old = {info.filename: info for info in z.infolist()}
+                self.old_f = Path(previous).open("rb")
+            except BadZipFile as e:
+                _logger.warning("Cannot reuse %s: %s", previous, e)
+        self.reused = 0
+        self.tmp = self.p.with_name(self.p.name + ".temp")
+        self.f = self.tmp.open("wb")
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        self.queue = deque()  # futures of members not written yet
+        self.central = []  # central directory records
+        self.raw_size = 0
+        self.start = time.perf_counter()
+        now = datetime.now()
+        self.dos_time = (now.hour << 11) | (now.minute << 5) | (now.second // 2)
+        self.dos_date = ((now.year - 1980) << 9) | (now.month << 5) | now.day
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def writestr(self, name: str, data, store: bool = None) -> None:
+        """Add a member, compressed in the background.
+
+        Args:
+            name: path of the member in the zip file
+            data: content of the member, str is encoded as UTF-8
+            store: if True, store without compression; by default media
+                files are stored and other files are deflated
+
+        Returns:
+            None
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if store is None:
+            store = Path(name).suffix.lower() in STORED_SUFFIXES
+        self.raw_size += len(data)
+        old = self.old.get(name)
+        if old is not None and _unchanged(old, data):
+            future = Future()
+            future.set_result(
+                (name, old.compress_type, old.CRC, old.file_size, self._read_old(old))
+            )
+            self.queue.append(future)
+            self.reused += 1
+        else:
+            self.queue.append(
+                self.pool.submit(
+                    compress_member, name, data, None if store else self.level
+                )
+            )
+        self._drain()
+
+    def writecompressed(self, member: Tuple[str, int, int, int, bytes]) -> None:
+        """Add a member compressed beforehand, such as in another process.
+
+        Args:
+            member: name, method, crc, size and compressed data of the member,
+                as returned by compress_member
+
+        Returns:
+            None
+        """
+        future = Future()
+        future.set_result(member)
+        self.queue.append(future)
+        self.raw_size += member[3]
+        self._drain()
+
+    def write(self, path: PathStr, name: str, store: bool = None) -> None:
+        """Add the file as a member, see writestr."""
+        self.writestr(name, Path(path).read_bytes(), store)
+
+    def _drain(self) -> None:
+        """Write the oldest members, keep a bounded number of them in memory."""
+        while len(self.queue) > self.workers * 4:
+            self._write(*self.queue.popleft().result())
+
+    def close(self) -> None:
+        """Write the remaining members and the central directory."""
+        if self.f.closed:
+            return
+        try:
+            while self.queue:
+                self._write(*self.queue.popleft().result())
+            offset = self.f.tell()
+            for record in self.central:
+                self.f.write(record)
+            size = self.f.tell() - offset
+            self.f.write(
+                _END_RECORD.pack(
+                    b"PK\x05\x06",
+                    0,
+                    0,
+                    len(self.central),
+                    len(self.central),
+                    size,
+                    offset,
+                    0,
+                )
+            )
+            total = self.f.tell()
+        except BaseException:
+            self.abort()
+            raise
+        self._close_files()
+        self.tmp.replace(self.p)
+        _logger.info(
+            "Zipped %s members (%s profile, %s reused): %.1f KiB -> %.1f KiB "
+            "(%.1f%%) in %.2fs",
+            len(self.central),
+            self.profile,
+            self.reused,
+            self.raw_size / 1024,
+            total / 1024,
+            100 * total / self.raw_size if self.raw_size else 0.0,
+            time.perf_counter() - self.start,
+        )
+
+    def abort(self) -> None:
+        """Stop writing and remove the temporary file, keep the old archive."""
+        if self.f.closed:
+            return
+        self._close_files()
+        self.tmp.unlink()
+
+    def _close_files(self) -> None:
+        """Stop the threads and close the archives."""
+        self.pool.shutdown()
+        self.f.close()
+        if self.old_f is not None:
+            self.old_f.close()
+
+    def _read_old(self, info: ZipInfo) -> bytes:
+        """Return the compressed data of a member of the previous archive."""
+        self.old_f.seek(info.header_offset)
+        header = self.old_f.read(_LOCAL_HEADER.size)
+        name_len, extra_len = struct.unpack("<2H", header[-4:])
+        self.old_f.seek(info.header_offset + _LOCAL_HEADER.size + name_len + extra_len)
+        return self.old_f.read(info.compress_size)
+
+    def _write(
+        self, name: str, method: int, crc: int, size: int, compressed: bytes
+    ) -> None:
+        """Write the local header and the data of a compressed member."""
+        fname = name.encode("utf-8")
+        flags = 0x800 if not fname.isascii() else 0  # UTF-8 file name
+        offset = self.f.tell()
+        if offset > 0xFFFFFFFF or len(compressed) > 0xFFFFFFFF:
+            raise ZipWriterError("Zip file too large, ZIP64 is not supported.")
+        self.f.write(
+            _LOCAL_HEADER.pack(
+                b"PK\x03\x04",
+                20,
+                flags,
+                method,
+                self.dos_time,
+                self.dos_date,
+                crc,
+                len(compressed),
+                size,
+                len(fname),
+                0,
+            )
+        )
+        self.f.write(fname)
+        self.f.write(compressed)
+        self.central.append(
+            _CENTRAL_HEADER.pack(
+                b"PK\x01\x02",
+                20,
+                20,
+                flags,
+                method,
+                self.dos_time,
+                self.dos_date,
+                crc,
+                len(compressed),
+                size,
+                len(fname),
+                0,
+                0,
+                0,
+                0,
+                0,
+                offset,
+            )
+            + fname
+        )
+
+
+class ZipWriterError(Exception):
+    """Zip writer exception."""
+
+
+def _unchanged(info: ZipInfo, data: bytes) -> bool:
+    """Check if the member of the previous archive has the same content."""
+    return (
+        info.file_size == len(data)
+        and info.compress_type in (_STORED, _DEFLATED)
+        and not info.flag_bits & 0x1  # encrypted
+        and info.CRC == zlib.crc32(data)
+    )
+
+
+def compress_member(
+    name: str, data: bytes, level: int
+) -> Tuple[str, int, int, int, bytes]:
+    """Return name, method, crc, size and compressed data of a member.
+
+    Args:
+        name: path of the member in the zip file
+        data: content of the member
+        level: deflate level, None to store the data
+
+    Returns:
+        Tuple[str, int, int, int, bytes]: values needed by the zip headers
+    """
+    crc = zlib.crc32(data)
+    if level is None:
+        return name, _STORED, crc, len(data), data
+    c = zlib.compressobj(level, zlib.DEFLATED, -15)
+    compressed = c.compress(data) + c.flush()
+    if len(compressed) >= len(data):
+        # deflate made it bigger, tiny files are smaller stored
+        return name, _STORED, crc, len(data), data
+    return name, _DEFLATED, crc, len(data), compressed
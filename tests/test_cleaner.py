@@ -0,0 +1,88 @@
+"""Check the fused cleaner against escape_char and fix_bad_indent.
+
+The reference is the per-line pipeline used before the fused cleaner: strip,
+escape_char, fix_bad_indent and one "<p>" tag per paragraph.
+"""
+import random
+
+import pytest
+
+from novelutils.utils.file import escape_char, fix_bad_indent, merge_lines, p_tags
+
+PIECES = [
+    "Chương",
+    "mặt trời",
+    "anh ta,",
+    "nói:",
+    "rằng",
+    "Không",
+    "x < y",
+    "a & b",
+    "<b>&amp;</b>",
+    "ⅰ roman",
+    "中文",
+    "ệ",
+    "",
+    " ",
+    "  tab\t",
+    "end.",
+    "(paren",
+    "Đây",
+    "ß",
+]
+
+
+def reference(text: str) -> str:
+    """Convert lines to <p> tags with the original functions."""
+    lines = [escape_char(line.strip()) for line in text.splitlines()]
+    return "\n\n  ".join("<p>" + line + "</p>" for line in fix_bad_indent(tuple(lines)))
+
+
+def fused(text: str) -> str:
+    """Convert lines to <p> tags with the fused cleaner."""
+    return p_tags(merge_lines([line.strip() for line in text.splitlines()]))
+
+
+def random_text(rnd: random.Random, lines: int) -> str:
+    """Return a random chapter body."""
+    return "\n".join(
+        " ".join(rnd.choice(PIECES) for _ in range(rnd.randint(0, 6)))
+        for _ in range(lines)
+    )
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Một dòng.",
+        "Anh ta nói:\nrằng không sao.\nHết.",
+        "Dòng một,\nDòng hai\n\n\nDòng ba",
+        "x < y & y > z\n<p>không phải thẻ</p>",
+        "中文第一行\n中文第二行",
+        "  thụt lề  \n\tsau tab\n",
+        "Start\n" + "\n".join(["word"] * 200),
+    ],
+)
+def test_same_as_reference(text):
+    assert fused(text) == reference(text)
+
+
+def test_random_same_as_reference():
+    rnd = random.Random(0)
+    for _ in range(3000):
+        text = random_text(rnd, rnd.randint(1, 12))
+        try:
+            expected = reference(text)
+        except IndexError:
+            with pytest.raises(IndexError):
+                fused(text)
+            continue
+        assert fused(text) == expected, text
+
+
+@pytest.mark.parametrize("text", ["", "\n \n\t\n"])
+def test_no_paragraph(text):
+    with pytest.raises(IndexError):
+        reference(text)
+    with pytest.raises(IndexError):
+        fused(text)